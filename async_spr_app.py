@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import weakref
+
+from spr_api.errors import SprApiError
+from spr_api.json_codec import get_codec, is_not_json
+from spr_api.rate_limit import RateLimiter, rate_limiter, is_throttled, throttle_delay, DEFAULT_RATE, DEFAULT_BURST, \
+    DEFAULT_MAX_THROTTLE_RETRIES
+from spr_api.spr_auth import SprAuth
+from spr_api.spr_auth import DEFAULT_BASE_URL
+from spr_api.spr_app import api_url
+from spr_api.transport import DEFAULT_POOL_SIZE, DEFAULT_MAX_RETRIES, DEFAULT_BACKOFF_FACTOR, \
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, RETRY_STATUS_CODES
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger("async_spr_app")
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+# concurrency limits are shared by every AsyncSprApp using the same env/key on the same event loop
+_concurrency_limits = weakref.WeakKeyDictionary()
+
+
+def _concurrency_limit(env, key, max_concurrency):
+    limits = _concurrency_limits.setdefault(asyncio.get_running_loop(), {})
+    if (env, key) not in limits:
+        limits[(env, key)] = asyncio.Semaphore(max_concurrency)
+    return limits[(env, key)]
+
+
+class AsyncSprApp:
+    """
+    Asyncio application object used to make api calls, the non-blocking twin of SprApp.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, env=None, key=None, secret=None, redirect_uri=None, username=None,
+                 password=None, auth_code=None, pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_factor=DEFAULT_BACKOFF_FACTOR, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, max_concurrency=DEFAULT_MAX_CONCURRENCY, spr_auth=None,
+                 credentials_store=None, codec=None, rate_limit=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 max_throttle_retries=DEFAULT_MAX_THROTTLE_RETRIES):
+        """
+        Parameters
+        ----------
+        base_url, env, key, secret, redirect_uri, username, password, auth_code : see SprApp
+        pool_size : max no of keep-alive connections kept open per host
+        max_retries : no of retries on connection errors and 502/503/504 responses
+        backoff_factor : exponential backoff factor between retries, in seconds
+        connect_timeout : seconds to wait for a connection to be established
+        read_timeout : seconds to wait for the server to send data
+        max_concurrency : max no of calls in flight for this env/key on the running event loop
+        spr_auth : an existing SprAuth (e.g. SprApp.spr_auth) to share tokens with
+        credentials_store : TokenStore the tokens are read from and saved to, see spr_api.token_store
+        codec : json codec of request and response bodies, see SprApp
+        rate_limit, burst, max_throttle_retries : see SprApp, the token bucket of an env/key is shared with the
+            SprApps of the process using it
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncSprApp requires aiohttp, install it with: pip install aiohttp")
+        self.base_url = base_url
+        if spr_auth is None:
+            spr_auth = SprAuth(env, key, secret, redirect_uri, username=username, password=password,
+                               auth_code=auth_code, base_url=base_url, credentials_store=credentials_store)
+        self.spr_auth = spr_auth
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_concurrency = max_concurrency
+        self.codec = get_codec(codec)
+        if rate_limit is not None and not isinstance(rate_limit, RateLimiter):
+            rate_limit = rate_limiter(spr_auth.env, spr_auth.key, rate_limit, burst)
+        self.rate_limiter = rate_limit
+        self.max_throttle_retries = max_throttle_retries
+        self.session = None
+        self._refresh_lock = None
+
+    @classmethod
+    def from_app(cls, app, **kwargs):
+        """
+        Creates an AsyncSprApp sharing the base url and tokens of a SprApp.
+        """
+        kwargs.setdefault("codec", app.codec)
+        kwargs.setdefault("rate_limit", app.rate_limiter)
+        return cls(base_url=app.base_url, spr_auth=app.spr_auth, **kwargs)
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+    async def request(self, method, endpoint, params=None, headers=None, data=None):
+        """
+        Adds the Auth Headers and makes api call. If auth token is invalid, it is refreshed.
+        Returns the response from api call.
+        """
+
+        # initial default parameters
+        if data is None:
+            data = {}
+        if headers is None:
+            headers = {}
+        if params is None:
+            params = {}
+
+        # adding auth headers
+        if not "Authorization" in headers:
+            headers["Authorization"] = "Bearer {}".format(self.spr_auth.access_token)
+        if not "Key" in headers:
+            headers["Key"] = self.spr_auth.key
+
+        endpoint = api_url(self.base_url, self.spr_auth.env, endpoint)
+
+        async with _concurrency_limit(self.spr_auth.env, self.spr_auth.key, self.max_concurrency):
+            status, content = await self._send(method, endpoint, headers, data, params)
+            if status == 401:
+                await self.refresh_token(headers["Authorization"])
+                headers["Authorization"] = "Bearer {}".format(self.spr_auth.access_token)
+                status, content = await self._send(method, endpoint, headers, data, params)
+
+        try:
+            body = self.codec.loads(content)
+        except ValueError as e:
+            # handles non-json responses (e.g. HTTP 404, 500, 502, 503, 504)
+            if is_not_json(e):
+                text = content.decode("utf-8", errors="replace")
+                logger.error("There was an error with this request: \n{}\n{}\n{}".format(endpoint, data, text))
+                raise SprApiError(text, status)
+            else:
+                raise
+        if "errors" in body and body["errors"]:
+            logger.error("There was an error with this request: \n{}\n{}\n{}".format(endpoint, data, body["errors"]))
+            raise SprApiError(body["errors"], status)
+        return body["data"]
+
+    async def _send(self, method, endpoint, headers, data, params):
+        """
+        Sends the call, retrying connection errors and 502/503/504 responses, and throttled responses after their
+        Retry-After. Returns (status, body bytes).
+        """
+        attempt = 0
+        throttled = 0
+        while True:
+            if self.rate_limiter is not None:
+                await asyncio.sleep(self.rate_limiter.reserve())
+            try:
+                async with self._session().request(method, endpoint, headers=headers, data=data,
+                                                   params=params) as response:
+                    content = await response.read()
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.observe(response.headers)
+                    if is_throttled(response.status, response.headers) and throttled < self.max_throttle_retries:
+                        delay = throttle_delay(response.headers, throttled)
+                        logger.info("Call to {} was throttled, sending it again in {:.1f}s".format(endpoint, delay))
+                        throttled += 1
+                        if self.rate_limiter is not None:
+                            self.rate_limiter.pause(delay)
+                        else:
+                            await asyncio.sleep(delay)
+                        continue
+                    if response.status not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                        return response.status, content
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    async def refresh_token(self, stale_authorization=None):
+        """
+        Refreshes the access token. Concurrent callers which got a 401 for the same token share one refresh.
+        """
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if stale_authorization is not None and \
+                    stale_authorization != "Bearer {}".format(self.spr_auth.access_token):
+                # another call already refreshed the token while this one waited
+                return
+            stale_token = stale_authorization[len("Bearer "):] if stale_authorization is not None else None
+            # the refresh is coordinated with other processes through blocking file/db locks, run it off the loop
+            await asyncio.get_running_loop().run_in_executor(None, self.spr_auth.refresh_access_token, stale_token)
+
+    async def close(self):
+        """
+        Closes the pooled connections held by this app.
+        """
+        if self.session is not None:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -80,7 +80,8 @@ def password_auth():
     try:
         print("Authenticating user to {} : {}".format(args.environment, args.username))
         SprAuth(env=args.environment, key=args.client_id, secret=args.client_secret, redirect_uri=args.redirect_url,
-                username=args.username, password=args.password)
+                username=args.username, password=args.password,
+                credentials_store=credentials.CredentialsFile(args.store))
         print("Success!")
     except KeyError as e:
         print(e)
@@ -154,7 +155,7 @@ def oauth():
         ensure_not_none_value(args.code)
         print("Authenticating user to {}".format(args.environment))
         SprAuth(env=args.environment, key=args.client_id, secret=args.client_secret, redirect_uri=args.redirect_url,
-                auth_code=args.code)
+                auth_code=args.code, credentials_store=credentials.CredentialsFile(args.store))
         print("Success!")
     except KeyError as e:
         print(e)
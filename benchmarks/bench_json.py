@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of the json handling of a report page: decoding the response body the way SprApp.request used to
+(five response.json() calls) against decoding it once with each available codec, and encoding a lookup request.
+
+    python -m spr_api.benchmarks.bench_json --rows 20000 --text-bytes 32
+"""
+import argparse
+import json
+import time
+
+from spr_api.benchmarks.stub_server import SimulatorConfig, report_page
+from spr_api.json_codec import CODECS, get_codec
+from spr_api.lookup_api import LookupRequest
+
+
+def best_of(call, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def available_codecs():
+    codecs = []
+    for name in CODECS:
+        try:
+            codecs.append(get_codec(name))
+        except ImportError:
+            pass
+    return codecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="No of rows of the report page.")
+    parser.add_argument("--text-bytes", type=int, default=32, help="Size of every generated dimension value.")
+    parser.add_argument("--keys", type=int, default=1000, help="No of keys of the lookup request.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the best one is reported.")
+    args = parser.parse_args()
+
+    payload = {"pageSize": args.rows, "page": 0, "startTime": 1704067200000,
+               "groupBys": [{"heading": "Date", "dimensionName": "SN_CREATED_TIME", "details": {"interval": "1h"}},
+                            {"heading": "Source", "dimensionName": "SOURCE"},
+                            {"heading": "Topic", "dimensionName": "TOPIC_IDS"}],
+               "projections": [{"heading": "Mentions"}, {"heading": "Reach"}]}
+    body = json.dumps({"data": report_page(payload, SimulatorConfig(pages=1, text_bytes=args.text_bytes)),
+                       "errors": []}).encode()
+    print("report page: {} rows, {:.1f} MB".format(args.rows, len(body) / 1e6))
+
+    def decode_five_times():
+        for _ in range(5):
+            json.loads(body)
+
+    baseline = best_of(decode_five_times, args.repeat)
+    print("{:<32} {:>10.1f} ms".format("json x5 (previous SprApp)", baseline * 1000))
+    for codec in available_codecs():
+        elapsed = best_of(lambda: codec.loads(body), args.repeat)
+        print("{:<32} {:>10.1f} ms {:>8.1f}x".format(codec.name + " x1", elapsed * 1000, baseline / elapsed))
+
+    lookup_request = LookupRequest()
+    lookup_request.type("LST_TOPIC_NAME")
+    lookup_request.add_keys(["topic name {}".format(index) for index in range(args.keys)])
+    baseline = best_of(lambda: json.dumps(lookup_request, default=lambda o: o.__dict__).encode(), args.repeat * 20)
+    print("\nlookup request: {} keys".format(args.keys))
+    print("{:<32} {:>10.3f} ms".format("json.dumps default=__dict__", baseline * 1000))
+    for codec in available_codecs():
+        elapsed = best_of(lambda: lookup_request.toJsonBytes(codec), args.repeat * 20)
+        print("{:<32} {:>10.3f} ms {:>8.1f}x".format("toJsonBytes " + codec.name, elapsed * 1000, baseline / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Memory benchmark of the query builder state and of result rows: listening clauses kept as dicts against the slotted
+Clause objects of Query, and rows kept as lists (as decoded) or dicts against the tuple backed Rows of
+with_records. Only the containers are measured, the values are shared by every representation.
+
+    python -m spr_api.benchmarks.bench_memory --queries 10000 --rows 1000000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from spr_api.benchmarks.stub_server import report_page, SimulatorConfig
+from spr_api.listening.Clauses import FilterClause, GroupClause, ProjectionClause
+from spr_api.reporting.Rows import to_rows
+
+HEADINGS = ["Hour", "Source", "Mentions"]
+GROUP_BYS = [{"heading": "Hour", "dimensionName": "SN_CREATED_TIME", "details": {"interval": "1h"}},
+             {"heading": "Source", "dimensionName": "LISTENING_MEDIA_TYPE"}]
+PROJECTIONS = [{"heading": "Mentions"}]
+
+
+def measure(build):
+    """
+    Returns the bytes still allocated by the object build() returns, and the object.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def clause_dicts(queries):
+    return [([{"key": "topic", "operator": "IN", "values": ("Brand",)},
+              {"key": "sources", "operator": "IN", "values": ("TWITTER", "FACEBOOK")},
+              {"key": "sentiment", "operator": "NIN", "values": ("neg",)}],
+             [{"key": "created_hour", "heading": "Hour"}, {"key": "source", "heading": "Source"}],
+             [{"key": "mentions", "heading": "Mentions"}]) for _ in range(queries)]
+
+
+def clause_objects(queries):
+    return [([FilterClause("topic", "IN", ("Brand",)),
+              FilterClause("sources", "IN", ("TWITTER", "FACEBOOK")),
+              FilterClause("sentiment", "NIN", ("neg",))],
+             [GroupClause("created_hour", "Hour"), GroupClause("source", "Source")],
+             [ProjectionClause("mentions", "Mentions")]) for _ in range(queries)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=10000, help="No of queries of the clause measurement.")
+    parser.add_argument("--rows", type=int, default=1000000, help="No of rows of the row measurement.")
+    args = parser.parse_args()
+
+    print("{:<28} {:>12} {:>14}".format("representation", "MB", "bytes/item"))
+
+    def report(name, size, count):
+        print("{:<28} {:>12.1f} {:>14.1f}".format(name, size / 1024 / 1024, size / count))
+
+    for name, build in (("clauses as dicts", clause_dicts), ("slotted clauses", clause_objects)):
+        size, _ = measure(lambda: build(args.queries))
+        report(name, size, args.queries)
+
+    page = report_page({"page": 0, "pageSize": args.rows, "groupBys": GROUP_BYS, "projections": PROJECTIONS},
+                       SimulatorConfig(pages=1))
+    values = page["rows"]
+    size, _ = measure(lambda: [list(row) for row in values])
+    report("rows as lists", size, args.rows)
+    size, _ = measure(lambda: [dict(zip(HEADINGS, row)) for row in values])
+    report("rows as dicts", size, args.rows)
+    size, _ = measure(lambda: to_rows(HEADINGS, values))
+    report("Rows", size, args.rows)
+
+
+if __name__ == "__main__":
+    main()
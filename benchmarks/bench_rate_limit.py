@@ -0,0 +1,70 @@
+"""
+Compares multi-threaded callers of one api key against a simulator enforcing a qps limit, with and without the
+token bucket of SprApp: calls/s completed, and no of calls the simulator rejected for going over the limit.
+
+    python -m spr_api.benchmarks.bench_rate_limit --requests 100 --threads 8 --qps-limit 20
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from spr_api.benchmarks.stub_server import SimulatorConfig, start_stub_server, base_url
+
+ENV = "prod"
+KEY = "bench-key"
+
+
+def _app(url, rate_limit, threads):
+    from spr_api.rate_limit import RateLimiter
+    from spr_api.spr_app import SprApp
+    from spr_api.token_store import MemoryTokenStore
+
+    store = MemoryTokenStore({ENV: {KEY: {"secret": "secret", "redirect_uri": "http://localhost",
+                                          "access_token": "token", "refresh_token": "refresh",
+                                          "expires_at": time.time() + 3600}}})
+    # a new bucket per run, the process wide one of the key would carry over between runs
+    limiter = RateLimiter(rate_limit) if rate_limit is not None else None
+    return SprApp(base_url=url, env=ENV, key=KEY, credentials_store=store, background_refresh=False,
+                  pool_size=threads, rate_limit=limiter)
+
+
+def run(server, app, total, threads):
+    def call():
+        try:
+            app.request("GET", "me")
+            return True
+        except RuntimeError:
+            return False
+
+    before = server.stats.snapshot()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        completed = sum(pool.map(lambda _: call(), range(total)))
+    elapsed = time.perf_counter() - start
+    throttled = server.stats.snapshot()["throttled"] - before["throttled"]
+    return completed, completed / elapsed, throttled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", "-n", type=int, default=100, help="No of calls per mode.")
+    parser.add_argument("--threads", "-t", type=int, default=8, help="No of concurrent callers.")
+    parser.add_argument("--qps-limit", type=float, default=20, help="Calls per second the simulator allows.")
+    parser.add_argument("--latency", type=float, default=0.01, help="Server side latency per call, in seconds.")
+    args = parser.parse_args()
+
+    server = start_stub_server(config=SimulatorConfig(latency=args.latency, qps_limit=args.qps_limit))
+    url = base_url(server)
+    print("{:<16} {:>10} {:>10} {:>10}".format("mode", "completed", "calls/s", "throttled"))
+    for mode, rate_limit in (("unpaced", None), ("token bucket", args.qps_limit)):
+        app = _app(url, rate_limit, args.threads)
+        completed, per_second, throttled = run(server, app, args.requests, args.threads)
+        print("{:<16} {:>10} {:>10.1f} {:>10}".format(mode, completed, per_second, throttled))
+        app.close()
+        # lets the window of the simulator empty between the runs
+        time.sleep(1)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares requests/s of SprApp's pooled keep-alive session against a new connection per call (the behaviour of
+calling requests.request directly), using a local stub server.
+
+    python -m spr_api.benchmarks.bench_session --requests 2000 --threads 4
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from spr_api.benchmarks.stub_server import start_stub_server, base_url
+
+ENV = "prod"
+KEY = "bench-key"
+
+
+def write_credentials(home):
+    credentials = Path(home) / ".sprinklr" / "auth_file.txt"
+    credentials.parent.mkdir(parents=True, exist_ok=True)
+    with open(credentials, "wb") as f:
+        pickle.dump({ENV: {KEY: {"secret": "secret", "redirect_uri": "http://localhost", "access_token": "token",
+                                 "refresh_token": "refresh", "expires_at": time.time() + 3600}}}, f)
+
+
+def run(call, total, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: call(), range(total)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", "-n", type=int, default=2000, help="No of calls per mode.")
+    parser.add_argument("--threads", "-t", type=int, default=4, help="No of concurrent callers.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Server side latency per call, in seconds.")
+    args = parser.parse_args()
+
+    # SprAuth reads the credentials from the home directory, point it at a throw away one
+    home = tempfile.mkdtemp()
+    os.environ["HOME"] = home
+    write_credentials(home)
+    from spr_api.spr_app import SprApp
+
+    server = start_stub_server(latency=args.latency)
+    url = base_url(server)
+    app = SprApp(base_url=url, env=ENV, key=KEY, pool_size=args.threads, rate_limit=None)
+    endpoint = url + "api/v2/me"
+    headers = {"Authorization": "Bearer token", "Key": KEY}
+
+    per_call = run(lambda: requests.request("GET", endpoint, headers=dict(headers)).json(), args.requests,
+                   args.threads)
+    pooled = run(lambda: app.request("GET", "me"), args.requests, args.threads)
+
+    print("per-call connections : {:10.1f} req/s".format(per_call))
+    print("pooled session       : {:10.1f} req/s".format(pooled))
+    print("speedup              : {:10.2f}x".format(pooled / per_call))
+    app.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
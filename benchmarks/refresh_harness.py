@@ -0,0 +1,152 @@
+"""
+Simulates N worker processes sharing one credentials file which all get a 401 at the same moment, against a
+local fake OAuth server that rotates refresh tokens (a refresh token is only valid once). Reports how many
+refresh calls reached the server and how many workers ended up without a valid token.
+
+    python -m spr_api.benchmarks.refresh_harness --processes 50
+    python -m spr_api.benchmarks.refresh_harness --processes 50 --uncoordinated
+
+Exits with status 1 when the coordinated refresh did not result in exactly one refresh call and no failures.
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+ENV = "prod"
+KEY = "harness-key"
+
+
+class FakeOAuthHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state = None
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        state = self.state
+        url = urlparse(self.path)
+        if url.path.endswith("oauth/token/"):
+            refresh_token = parse_qs(url.query).get("refresh_token", [None])[0]
+            with state["lock"]:
+                # simulated server side work, widens the window in which workers race
+                time.sleep(0.05)
+                if refresh_token != state["refresh_token"]:
+                    state["refresh_rejected"] += 1
+                    return self._send(400, {"error": "invalid_grant"})
+                state["refresh_accepted"] += 1
+                generation = state["refresh_accepted"]
+                state["access_token"] = "access-{}".format(generation)
+                state["refresh_token"] = "refresh-{}".format(generation)
+                return self._send(200, {"access_token": state["access_token"],
+                                        "refresh_token": state["refresh_token"], "expires_in": 3600})
+        if self.headers.get("Authorization") != "Bearer {}".format(state["access_token"]):
+            return self._send(401, {"errors": ["invalid token"]})
+        return self._send(200, {"data": {"key": KEY}})
+
+    def _send(self, status, body):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_oauth_server():
+    state = {"lock": threading.Lock(), "access_token": "access-0", "refresh_token": "refresh-0",
+             "refresh_accepted": 0, "refresh_rejected": 0}
+    handler = type("ConfiguredFakeOAuthHandler", (FakeOAuthHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def worker(base_url, credentials_path, barrier, results, uncoordinated):
+    from spr_api.spr_app import SprApp
+    from spr_api.token_store import FileTokenStore
+
+    app = SprApp(base_url=base_url, env=ENV, key=KEY, credentials_store=FileTokenStore(credentials_path),
+                 background_refresh=False, max_retries=0)
+    if uncoordinated:
+        # every process refreshes on its own, as SprApp used to
+        app.spr_auth.refresh_access_token = lambda stale_token=None: app.spr_auth.gen_access_token_from_refresh_token()
+    barrier.wait()
+    try:
+        app.request("GET", "me")
+        results.put(None)
+    except Exception as e:
+        results.put(repr(e))
+
+
+def run(processes, uncoordinated=False):
+    """
+    Runs the simulation with processes workers. Returns (state of the fake server, errors of the failed workers,
+    elapsed seconds).
+    """
+    from spr_api.token_store import FileTokenStore
+
+    server, state = start_fake_oauth_server()
+    host, port = server.server_address[:2]
+    base_url = "http://{}:{}/".format(host, port)
+    credentials_path = Path(tempfile.mkdtemp()) / "auth_file.txt"
+    # a token the server no longer accepts, so every worker gets a 401 on its first call
+    FileTokenStore(credentials_path).update_key(KEY, ENV, "secret", "http://localhost", "stale-access",
+                                                 state["refresh_token"], time.time() + 3600)
+
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [context.Process(target=worker, args=(base_url, credentials_path, barrier, results, uncoordinated))
+               for _ in range(processes)]
+    start = time.perf_counter()
+    try:
+        for process in workers:
+            process.start()
+        errors = [error for error in (results.get() for _ in workers) if error is not None]
+        for process in workers:
+            process.join()
+    finally:
+        server.shutdown()
+    return state, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", "-n", type=int, default=20, help="No of worker processes.")
+    parser.add_argument("--uncoordinated", action="store_true", help="Refresh without the cross process lock.")
+    args = parser.parse_args()
+
+    state, errors, elapsed = run(args.processes, args.uncoordinated)
+
+    print("processes                : {}".format(args.processes))
+    print("refresh calls accepted   : {}".format(state["refresh_accepted"]))
+    print("refresh calls rejected   : {}".format(state["refresh_rejected"]))
+    print("failed workers           : {}".format(len(errors)))
+    print("elapsed                  : {:.2f}s".format(elapsed))
+    for error in errors[:5]:
+        print("  " + error)
+    if not args.uncoordinated and (state["refresh_accepted"] + state["refresh_rejected"] != 1 or errors):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
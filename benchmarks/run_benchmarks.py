@@ -0,0 +1,226 @@
+"""
+Benchmark suite of the client against the local api simulator (stub_server). Every case runs in its own process
+so its peak RSS is measured in isolation.
+
+    python -m spr_api.benchmarks.run_benchmarks --iterations 200 --pages 10 --page-size 500
+    python -m spr_api.benchmarks.run_benchmarks --cases request lookup --json results.json
+
+Reports per case: operations, api calls, api calls/s, p50/p99 latency of one operation, bytes/s received and
+peak RSS. The listening Query cases need spr_api.reporting.Request and Response, they are reported as skipped
+when those modules are missing. The stream_pages cases page the payload of fetch_mentions by its stream cursor,
+as fetch_mentions(checkpoint=...) does, without them.
+"""
+import argparse
+import calendar
+import importlib.util
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from spr_api.benchmarks.stub_server import SimulatorConfig, start_stub_server, base_url
+
+ENV = "prod"
+KEY = "bench-key"
+START_TIME = "2024-01-01T00:00:00"
+END_TIME = "2024-03-31T23:59:59"
+# clauses shaped like the payload of fetch_mentions
+MENTIONS_CLAUSES = {"reportingEngine": "LISTENING", "report": "SPRINKSIGHTS", "timeZone": "UTC",
+                    "groupBys": [{"heading": "Message Id", "dimensionName": "ES_MESSAGE_ID"}],
+                    "projections": [{"heading": "Mentions", "measurementName": "MENTIONS_COUNT"}],
+                    "filters": [], "sorts": [], "additional": {"STREAM": True}}
+
+
+def _app(url):
+    from spr_api.spr_app import SprApp
+    from spr_api.token_store import MemoryTokenStore
+
+    store = MemoryTokenStore({ENV: {KEY: {"secret": "secret", "redirect_uri": "http://localhost",
+                                          "access_token": "token", "refresh_token": "refresh",
+                                          "expires_at": time.time() + 3600}}})
+    # pacing disabled, the cases measure the client and the simulator has no qps limit
+    return SprApp(base_url=url, env=ENV, key=KEY, credentials_store=store, background_refresh=False, rate_limit=None)
+
+
+def case_request(app, page_size):
+    app.request("GET", "me")
+
+
+def case_lookup(app, page_size):
+    from spr_api.lookup_api import LookupApi, LookupRequest
+
+    lookup_request = LookupRequest()
+    lookup_request.type("LST_TOPIC_NAME")
+    lookup_request.add_keys(["topic {}".format(index) for index in range(10)])
+    LookupApi(app).lookup(lookup_request)
+
+
+def case_fetch(app, page_size):
+    from spr_api.listening.Query import Query
+
+    query = Query(app, START_TIME, END_TIME, page_size).group_by_source().project_mentions("Mentions")
+    for _ in query.fetch():
+        pass
+
+
+def case_stream_rows(app, page_size):
+    from spr_api.listening.Query import Query
+
+    query = Query(app, START_TIME, END_TIME, page_size).group_by_source().project_mentions("Mentions")
+    for _ in query.stream_rows():
+        pass
+
+
+def case_fetch_all_with_time_groups(app, page_size):
+    from spr_api.listening.Query import Query
+
+    query = Query(app, START_TIME, END_TIME, page_size).group_by_created_hour().project_mentions("Mentions")
+    query.fetch_all_with_time_groups()
+
+
+def case_fetch_mentions(app, page_size):
+    from spr_api.listening.Query import Query
+
+    for _ in Query(app, START_TIME, END_TIME, page_size).fetch_mentions():
+        pass
+
+
+def _millis(iso_date):
+    return calendar.timegm(datetime.fromisoformat(iso_date).utctimetuple()) * 1000
+
+
+def _mentions_pages(app, page_size, checkpoint=None):
+    from spr_api.reporting.Compiled import CompiledQuery
+    from spr_api.reporting.Paging import StreamPages
+
+    compiled = CompiledQuery(MENTIONS_CLAUSES, _millis(START_TIME), _millis(END_TIME), page_size, app.codec)
+    for _ in StreamPages(app, compiled, checkpoint):
+        pass
+
+
+def case_stream_pages(app, page_size):
+    _mentions_pages(app, page_size)
+
+
+def case_stream_pages_checkpoint(app, page_size):
+    from spr_api.reporting.Checkpoint import Checkpoint
+
+    with tempfile.TemporaryDirectory() as directory:
+        _mentions_pages(app, page_size, Checkpoint("bench", directory))
+
+
+CASES = {
+    "request": case_request,
+    "lookup": case_lookup,
+    "fetch": case_fetch,
+    "stream_rows": case_stream_rows,
+    "fetch_all_with_time_groups": case_fetch_all_with_time_groups,
+    "fetch_mentions": case_fetch_mentions,
+    "stream_pages": case_stream_pages,
+    "stream_pages_checkpoint": case_stream_pages_checkpoint,
+}
+
+# cases built on spr_api.listening.Query
+QUERY_CASES = ("fetch", "stream_rows", "fetch_all_with_time_groups", "fetch_mentions")
+QUERY_MODULES = ("spr_api.reporting.Request", "spr_api.reporting.Response")
+
+
+def missing_modules(name):
+    """
+    Returns the modules case name needs which can not be imported.
+    """
+    if name not in QUERY_CASES:
+        return []
+    return [module for module in QUERY_MODULES if importlib.util.find_spec(module) is None]
+
+
+def run_case(name, url, iterations, page_size, results):
+    try:
+        app = _app(url)
+        case = CASES[name]
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            operation_start = time.perf_counter()
+            case(app, page_size)
+            latencies.append(time.perf_counter() - operation_start)
+        elapsed = time.perf_counter() - start
+        app.close()
+        # ru_maxrss is in kilobytes on linux and in bytes on macos
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        results.put({"latencies": latencies, "elapsed": elapsed, "peak_rss": peak_rss})
+    except Exception as e:
+        results.put({"error": repr(e)})
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES), help="Cases to run.")
+    parser.add_argument("--iterations", "-n", type=int, default=100, help="No of operations per case.")
+    parser.add_argument("--page-size", type=int, default=100, help="Page size of the report queries.")
+    parser.add_argument("--pages", type=int, default=5, help="No of full pages the simulator returns per report.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Server side latency per call, in seconds.")
+    parser.add_argument("--text-bytes", type=int, default=16, help="Size of every generated dimension value.")
+    parser.add_argument("--error-401-rate", type=float, default=0.0, help="Fraction of calls answered with 401.")
+    parser.add_argument("--error-5xx-rate", type=float, default=0.0, help="Fraction of calls answered with 503.")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to PATH, for regression tracking.")
+    args = parser.parse_args()
+
+    config = SimulatorConfig(latency=args.latency, pages=args.pages, text_bytes=args.text_bytes,
+                             error_401_rate=args.error_401_rate, error_5xx_rate=args.error_5xx_rate, seed=0)
+    server = start_stub_server(config=config)
+    url = base_url(server)
+    context = multiprocessing.get_context("spawn")
+    report = {}
+
+    print("{:<28} {:>7} {:>9} {:>11} {:>10} {:>10} {:>12} {:>10}".format(
+        "case", "ops", "api calls", "calls/s", "p50 ms", "p99 ms", "MB/s", "peak MB"))
+    for name in args.cases:
+        missing = missing_modules(name)
+        if missing:
+            print("{:<28} skipped: {} not found".format(name, ", ".join(missing)))
+            report[name] = {"skipped": missing}
+            continue
+        before = server.stats.snapshot()
+        results = context.Queue()
+        process = context.Process(target=run_case, args=(name, url, args.iterations, args.page_size, results))
+        process.start()
+        result = results.get()
+        process.join()
+        after = server.stats.snapshot()
+        if "error" in result:
+            print("{:<28} failed: {}".format(name, result["error"]))
+            report[name] = result
+            continue
+        calls = sum(after["requests"].values()) - sum(before["requests"].values())
+        received = after["bytes_sent"] - before["bytes_sent"]
+        elapsed = result["elapsed"]
+        report[name] = {
+            "operations": args.iterations,
+            "api_calls": calls,
+            "calls_per_second": calls / elapsed,
+            "p50_seconds": percentile(result["latencies"], 0.5),
+            "p99_seconds": percentile(result["latencies"], 0.99),
+            "bytes_per_second": received / elapsed,
+            "peak_rss_bytes": result["peak_rss"],
+        }
+        print("{:<28} {:>7} {:>9} {:>11.1f} {:>10.2f} {:>10.2f} {:>12.2f} {:>10.1f}".format(
+            name, args.iterations, calls, calls / elapsed, report[name]["p50_seconds"] * 1000,
+            report[name]["p99_seconds"] * 1000, received / elapsed / 1e6, result["peak_rss"] / 1e6))
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
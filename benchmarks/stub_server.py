@@ -0,0 +1,226 @@
+"""
+Local simulator of the sprinklr api used by the benchmarks. Implements oauth/token/, api/v2/me, api/v2/lookup and
+api/v2/reports/query with configurable latency, page counts, payload sizes and injected 401/5xx responses, and an
+optional qps limit. Reports are paged by page index, STREAM payloads (additional.STREAM) by cursor: every page
+but the last one returns the "cursor" of the next page, which is sent back as "cursor" of the next payload. Speaks
+HTTP/1.1 so clients can keep connections alive between calls.
+
+    python -m spr_api.benchmarks.stub_server --port 8080 --latency 0.02 --pages 10
+"""
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+HOUR_MILLIS = 60 * 60 * 1000
+INTERVAL_MILLIS = {'1h': HOUR_MILLIS, '1d': 24 * HOUR_MILLIS}
+
+
+class SimulatorConfig:
+    """
+    Parameters
+    ----------
+    latency : seconds every call takes on the server
+    pages : no of full pages of every report, one more partial page is returned after them
+    text_bytes : size of the text of every generated dimension value, to simulate larger payloads
+    error_401_rate : fraction of api calls answered with 401, forcing a token refresh
+    error_5xx_rate : fraction of api calls answered with a non-json 503
+    qps_limit : max api calls per second, the calls over it are answered with the mashery "Developer Over Qps" 403
+    seed : seed of the error injection
+    """
+
+    def __init__(self, latency=0.0, pages=5, text_bytes=16, error_401_rate=0.0, error_5xx_rate=0.0, qps_limit=None,
+                 seed=None):
+        self.latency = latency
+        self.pages = pages
+        self.text_bytes = text_bytes
+        self.error_401_rate = error_401_rate
+        self.error_5xx_rate = error_5xx_rate
+        self.qps_limit = qps_limit
+        self.random = random.Random(seed)
+
+
+class SimulatorStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes_sent = 0
+        self.errors_injected = 0
+        self.throttled = 0
+        self.calls = collections.deque()
+
+    def qps(self):
+        """
+        Counts an api call, returns the no of calls of the last second.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.calls.append(now)
+            while self.calls[0] <= now - 1:
+                self.calls.popleft()
+            return len(self.calls)
+
+    def record(self, path, size, injected=False, throttled=False):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.bytes_sent += size
+            self.errors_injected += injected
+            self.throttled += throttled
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": dict(self.requests), "bytes_sent": self.bytes_sent,
+                    "errors_injected": self.errors_injected, "throttled": self.throttled}
+
+
+def _group_value(group_by, index, start_time, text):
+    if group_by.get("dimensionName") == "SN_CREATED_TIME":
+        interval = INTERVAL_MILLIS.get((group_by.get("details") or {}).get("interval"), HOUR_MILLIS)
+        return start_time - start_time % interval + index * interval
+    if group_by.get("dimensionName") == "ES_MESSAGE_ID":
+        return "message-{}".format(index)
+    return "{}-{}-{}".format(group_by.get("dimensionName"), index % 50, text)
+
+
+def report_page(payload, config):
+    """
+    Returns the data of one page of a reports/query payload: pages full pages followed by a partial one. Pages of
+    a STREAM payload start at the row of its cursor and carry the cursor of the next page, none on the last page.
+    """
+    page_size = payload.get("pageSize", 100)
+    stream = bool((payload.get("additional") or {}).get("STREAM"))
+    if stream:
+        cursor = payload.get("cursor")
+        start = int(cursor.rsplit("-", 1)[1]) if cursor else 0
+    else:
+        start = payload.get("page", 0) * page_size
+    end = min(start + page_size, config.pages * page_size + page_size // 2)
+    group_bys = payload.get("groupBys") or []
+    projections = payload.get("projections") or []
+    text = "x" * config.text_bytes
+    start_time = payload.get("startTime", 0)
+    rows = []
+    for index in range(start, end):
+        row = [_group_value(group_by, index, start_time, text) for group_by in group_bys]
+        row += [index % 97 + 1 for _ in projections]
+        rows.append(row)
+    headings = [group_by.get("heading") for group_by in group_bys]
+    headings += [projection.get("heading") for projection in projections]
+    data = {"headings": headings, "rows": rows}
+    if stream and end - start == page_size:
+        data["cursor"] = "stream-cursor-{}".format(end)
+    return data
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, without this every keep-alive response stalls on delayed acks
+    disable_nagle_algorithm = True
+    config = SimulatorConfig()
+    stats = None
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        config = self.config
+        if config.latency:
+            time.sleep(config.latency)
+        path = urlparse(self.path).path
+
+        if path.endswith("oauth/token/"):
+            return self._send(path, 200, {"access_token": "simulated-access-token",
+                                          "refresh_token": "simulated-refresh-token", "expires_in": 3600})
+        headers = {}
+        if config.qps_limit is not None:
+            qps = self.stats.qps()
+            headers = {"X-Plan-QPS-Allotted": str(config.qps_limit), "X-Plan-QPS-Current": str(qps)}
+            if qps > config.qps_limit:
+                headers.update({"X-Mashery-Error-Code": "ERR_403_DEVELOPER_OVER_QPS", "Retry-After": "1"})
+                return self._send(path, 403, b"<h1>Developer Over Qps</h1>", throttled=True, headers=headers)
+        roll = config.random.random()
+        if roll < config.error_401_rate:
+            return self._send(path, 401, {"errors": ["Invalid token"]}, injected=True)
+        if roll < config.error_401_rate + config.error_5xx_rate:
+            return self._send(path, 503, b"Service Unavailable", injected=True)
+
+        if path.endswith("api/v2/me"):
+            return self._send(path, 200, {"data": {"name": "simulator"}}, headers=headers)
+        if path.endswith("api/v2/lookup"):
+            request = json.loads(body or b"{}")
+            return self._send(path, 200, {"data": {key: "{}-{}".format(request.get("lookupType"), key)
+                                                   for key in request.get("keys", [])}}, headers=headers)
+        if path.endswith("api/v2/reports/query"):
+            return self._send(path, 200, {"data": report_page(json.loads(body or b"{}"), config)}, headers=headers)
+        return self._send(path, 404, b"Not Found")
+
+    def _send(self, path, status, body, injected=False, throttled=False, headers=None):
+        raw = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if not isinstance(body, bytes) else "text/plain")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+        if self.stats is not None:
+            self.stats.record(path, len(raw), injected, throttled)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, config=None):
+    """
+    Starts the simulator on a daemon thread. Returns the server, its base url is returned by base_url(server)
+    and its counters by server.stats.snapshot().
+    """
+    config = config if config is not None else SimulatorConfig(latency=latency)
+    stats = SimulatorStats()
+    handler = type("ConfiguredSimulatorHandler", (SimulatorHandler,), {"config": config, "stats": stats})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server):
+    host, port = server.server_address[:2]
+    return "http://{}:{}/".format(host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Server side latency per call, in seconds.")
+    parser.add_argument("--pages", type=int, default=5, help="No of full pages of every report.")
+    parser.add_argument("--text-bytes", type=int, default=16, help="Size of every generated dimension value.")
+    parser.add_argument("--error-401-rate", type=float, default=0.0, help="Fraction of calls answered with 401.")
+    parser.add_argument("--error-5xx-rate", type=float, default=0.0, help="Fraction of calls answered with 503.")
+    parser.add_argument("--qps-limit", type=float, default=None, help="Max api calls per second.")
+    args = parser.parse_args()
+    config = SimulatorConfig(latency=args.latency, pages=args.pages, text_bytes=args.text_bytes,
+                             error_401_rate=args.error_401_rate, error_5xx_rate=args.error_5xx_rate,
+                             qps_limit=args.qps_limit)
+    server = start_stub_server(args.host, args.port, config=config)
+    print("Simulating the sprinklr api at {}".format(base_url(server)))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
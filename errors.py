@@ -0,0 +1,9 @@
+class SprApiError(RuntimeError):
+    """
+    Raised for api calls answered with an error or a non-json body. A RuntimeError, as raised before, with the
+    http status of the response as status_code.
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
@@ -0,0 +1,73 @@
+import logging
+
+logger = logging.getLogger("instrumentation")
+
+PRE_REQUEST = "pre_request"
+POST_RESPONSE = "post_response"
+ON_RETRY = "on_retry"
+ON_REFRESH = "on_refresh"
+EVENTS = (PRE_REQUEST, POST_RESPONSE, ON_RETRY, ON_REFRESH)
+
+
+class RequestInfo:
+    """
+    Describes one SprApp.request call, passed to the hooks of every event of the call.
+
+    Attributes
+    ----------
+    method, endpoint, url : of the call, endpoint is the api/v2 endpoint name (e.g. "reports/query")
+    status : http status of the last response, None before the response arrives
+    bytes_sent, bytes_received : request and response body sizes, summed over all attempts
+    retries : no of times the call was sent again (5xx/connection retries, the re-send after a 401 or a 429)
+    retry_reasons : status code or error of every retried attempt
+    timings : seconds spent per phase, summed over all attempts:
+        wait - from sending the call until the response headers arrived, includes dns/connect and server time
+        download - reading the response body
+        decode - parsing the json body
+        refresh - refreshing the access token after a 401
+        throttle - waiting for the rate limiter and the Retry-After of throttled responses
+        total - the whole call
+    error : exception raised by the call, if any
+    """
+
+    def __init__(self, method, endpoint, url):
+        self.method = method
+        self.endpoint = endpoint
+        self.url = url
+        self.status = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.retry_reasons = []
+        self.timings = {"wait": 0.0, "download": 0.0, "decode": 0.0, "refresh": 0.0, "throttle": 0.0,
+                        "total": 0.0}
+        self.error = None
+
+    def __repr__(self):
+        return "RequestInfo({} {} status={} retries={} total={:.3f}s)".format(
+            self.method, self.endpoint, self.status, self.retries, self.timings["total"])
+
+
+class Hooks:
+    """
+    Callbacks registered per event, each callback is called with the RequestInfo of the call. Errors raised by
+    callbacks are logged and never fail the call.
+    """
+
+    def __init__(self):
+        self._callbacks = {event: [] for event in EVENTS}
+
+    def add(self, event, callback):
+        if event not in self._callbacks:
+            raise ValueError("Unknown event: {}, expected one of {}".format(event, ", ".join(EVENTS)))
+        self._callbacks[event] = self._callbacks[event] + [callback]
+
+    def remove(self, event, callback):
+        self._callbacks[event] = [registered for registered in self._callbacks[event] if registered != callback]
+
+    def emit(self, event, info):
+        for callback in self._callbacks[event]:
+            try:
+                callback(info)
+            except Exception:
+                logger.exception("Hook {} for {} failed".format(callback, event))
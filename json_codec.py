@@ -0,0 +1,67 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonCodec:
+    """
+    Encodes request bodies and decodes response bodies. loads accepts bytes or str, dumps returns utf-8 bytes.
+    Decode errors are json.JSONDecodeError (or a subclass of it) for every backend.
+    """
+
+    name = "json"
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    Backed by orjson, several times faster than the json module on large report pages.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("OrjsonCodec requires orjson, install it with: pip install orjson")
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+
+CODECS = {"json": JsonCodec, "orjson": OrjsonCodec}
+
+
+def get_codec(codec=None):
+    """
+    Returns a codec instance.
+
+    Parameters
+    ----------
+    codec : a JsonCodec instance, a name from CODECS, or None for orjson when it is installed and json otherwise
+    """
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec is None:
+        codec = "orjson" if orjson is not None else "json"
+    if codec not in CODECS:
+        raise ValueError("Unknown json codec: {}, expected one of {}".format(codec, ", ".join(CODECS)))
+    return CODECS[codec]()
+
+
+def is_not_json(error):
+    """
+    Returns True when a decode error means the body is not json at all (e.g. an html or plain text error page of
+    HTTP 404, 500, 502, 503, 504), rather than broken json.
+    """
+    return isinstance(error, json.JSONDecodeError) and error.pos == 0
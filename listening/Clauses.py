@@ -0,0 +1,53 @@
+class Clause:
+    """
+    Immutable listening level clause of a Query, as returned back by with_request. Slotted, so a query holding
+    many clauses keeps no per clause dict. Clauses compare and hash by value, and also support the item access of
+    the dicts they replace (clause["key"]).
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            # lists are frozen so a clause can not change after it was added to a query
+            object.__setattr__(self, name, tuple(value) if isinstance(value, list) else value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __getitem__(self, name):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def asdict(self):
+        return {name: list(value) if isinstance(value, tuple) else value
+                for name, value in zip(self.__slots__, self._values())}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._values() == self._values()
+
+    def __hash__(self):
+        return hash((type(self), self._values()))
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join(
+            "{}={!r}".format(name, value) for name, value in zip(self.__slots__, self._values())))
+
+
+class FilterClause(Clause):
+    __slots__ = ("key", "operator", "values")
+
+
+class GroupClause(Clause):
+    __slots__ = ("key", "heading")
+
+
+class ProjectionClause(Clause):
+    __slots__ = ("key", "heading")
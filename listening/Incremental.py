@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from spr_api.reporting.Checkpoint import write_json
+
+DEFAULT_SERIES_DIR = Path.home() / ".sprinklr" / "series"
+# seconds before now (or the end of the last refresh) in which buckets may still receive late mentions
+DEFAULT_LATE_MARGIN = 60 * 60
+
+
+class SeriesStore:
+    """
+    Last materialised result of incremental time series queries, one json file per query shape in directory, or
+    in memory when directory is None. Callers scope the shapes to the account the results were fetched with.
+    """
+
+    def __init__(self, directory=DEFAULT_SERIES_DIR):
+        self.directory = Path(directory) if directory is not None else None
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _path(self, shape):
+        return self.directory / "{}.json".format(shape)
+
+    def load(self, shape):
+        """
+        Returns the saved state of a query shape ({"start_time", "end_time", "stable_until", "interval",
+        "time_column", "headings", "rows"}), None when there is none.
+        """
+        with self._lock:
+            if self.directory is None:
+                return self._series.get(shape)
+            try:
+                with open(self._path(shape)) as f:
+                    return json.load(f)
+            except (FileNotFoundError, ValueError):
+                return None
+
+    def save(self, shape, state):
+        with self._lock:
+            if self.directory is None:
+                self._series[shape] = state
+            else:
+                write_json(self._path(shape), state)
+
+    def clear(self, shape):
+        with self._lock:
+            self._series.pop(shape, None)
+            if self.directory is not None:
+                try:
+                    os.remove(self._path(shape))
+                except FileNotFoundError:
+                    pass
+
+
+def stable_until(end_time, interval, late_margin, now=None):
+    """
+    Returns the start of the first bucket (epoch millis) which may still change: the bucket holding the earlier of
+    end_time and now, moved back by late_margin seconds. Buckets before it are final.
+    """
+    now = time.time() * 1000 if now is None else now
+    settled = min(end_time + 1, now) - late_margin * 1000
+    return settled - settled % interval
+
+
+def refresh_plan(state, start_time, end_time, interval):
+    """
+    Returns (windows to fetch, rows of state to keep) to bring the series of state to [start_time, end_time].
+    Only the buckets from the stable bucket of state on are fetched, plus the partial first bucket when start_time
+    moved past the start of a bucket. Everything is fetched again when state is None, was built with another
+    bucket size, or does not cover the start of the range.
+    """
+    full = [(start_time, end_time)], []
+    if state is None or state["interval"] != interval or state["start_time"] > start_time:
+        return full
+    fetch_from = max(state["stable_until"], start_time)
+    if fetch_from > state["end_time"] + 1 or state["end_time"] > end_time:
+        return full
+    if fetch_from == start_time or start_time % interval == 0:
+        head, keep_from = [], start_time
+    else:
+        # the first bucket now starts mid way, its stored count covers more than the range
+        first_bucket_end = start_time - start_time % interval + interval
+        head, keep_from = [(start_time, first_bucket_end - 1)], first_bucket_end
+    time_column = state["time_column"]
+    rows = [row for row in state["rows"]
+            if row[time_column] is not None and keep_from <= row[time_column] < fetch_from]
+    tail = [(fetch_from, end_time)] if fetch_from <= end_time else []
+    return head + tail, rows
@@ -1,126 +1,69 @@
-from spr_api.lookup_api import LookupApi, LookupRequest
+from spr_api.lookup_api import LookupApi
+from spr_api.lookup_cache import LOOKUP_CACHE
 
 
-class Theme:
-    def __init__(self, lookupApi: LookupApi):
-        self.lookupApi = lookupApi
-
-    def get_id_from_names(self, names):
-        lookup_request = LookupRequest()
-        lookup_request.type("LST_THEME_NAME")
-        lookup_request.add_keys(names)
-        response_dict = self.lookupApi.lookup(lookup_request)
-        if len(response_dict) != len(names):
-            raise RuntimeError(
-                "Could not resolve all Themes for names. Missing names : " + str(names - response_dict.keys()))
-        return list(response_dict.values())
+class NameLookup:
+    """
+    Resolves names of one lookup type to ids. Names are served from the shared LOOKUP_CACHE when possible, only
+    the names missing in the cache are sent to the lookup api.
+    """
+    lookup_type = None
+    entity_name = None
 
-
-class Topic:
-
-    def __init__(self, lookupApi: LookupApi):
+    def __init__(self, lookupApi: LookupApi, cache=LOOKUP_CACHE):
         self.lookupApi = lookupApi
+        self.cache = cache
 
     def get_id_from_names(self, names):
-        lookup_request = LookupRequest()
-        lookup_request.type("LST_TOPIC_NAME")
-        lookup_request.add_keys(names)
-        response_dict = self.lookupApi.lookup(lookup_request)
-        if len(response_dict) != len(names):
+        response_dict = self.cache.resolve(self.lookupApi, self.lookup_type, names)
+        missing = [name for name in names if name not in response_dict]
+        if missing:
             raise RuntimeError(
-                "Could not resolve all Topics for names. Missing names : " + str(names - response_dict.keys()))
-        return list(response_dict.values())
-
-
-class TopicGroup:
-
-    def __init__(self, lookupApi: LookupApi):
-        self.lookupApi = lookupApi
-
-    def get_id_from_names(self, names):
-        lookup_request = LookupRequest()
-        lookup_request.type("LST_TOPIC_GROUP_NAME")
-        lookup_request.add_keys(names)
-        response_dict = self.lookupApi.lookup(lookup_request)
-        if len(response_dict) != len(names):
-            raise RuntimeError(
-                "Could not resolve all Topic Groups for names. Missing names : " + str(names - response_dict.keys()))
-        return list(response_dict.values())
-
-
-class KeywordList:
+                "Could not resolve all " + self.entity_name + " for names. Missing names : " + str(set(missing)))
+        return [response_dict[name] for name in names]
 
-    def __init__(self, lookupApi: LookupApi):
-        self.lookupApi = lookupApi
+    def get_id_from_name(self, name):
+        response_dict = self.cache.resolve(self.lookupApi, self.lookup_type, [name])
+        if name not in response_dict:
+            raise RuntimeError("Could not resolve " + self.entity_name + " for name: " + name)
+        return response_dict[name]
 
-    def get_id_from_names(self, names):
-        lookup_request = LookupRequest()
-        lookup_request.type("LST_KEYWORD_LIST_NAME")
-        lookup_request.add_keys(names)
-        response_dict = self.lookupApi.lookup(lookup_request)
-        if len(response_dict) != len(names):
-            raise RuntimeError(
-                "Could not resolve all Keyword Groups for names. Missing names : " + str(names - response_dict.keys()))
-        return list(response_dict.values())
 
+class Theme(NameLookup):
+    lookup_type = "LST_THEME_NAME"
+    entity_name = "Themes"
 
-class Country:
 
-    def __init__(self, lookupApi: LookupApi):
-        self.lookupApi = lookupApi
+class Topic(NameLookup):
+    lookup_type = "LST_TOPIC_NAME"
+    entity_name = "Topics"
 
-    def get_id_from_names(self, names):
-        lookup_request = LookupRequest()
-        lookup_request.type("LST_COUNTRY_NAME")
-        lookup_request.add_keys(names)
-        response_dict = self.lookupApi.lookup(lookup_request)
-        if len(response_dict) != len(names):
-            raise RuntimeError(
-                "Could not resolve all Countries for names. Missing names : " + str(names - response_dict.keys()))
-        return list(response_dict.values())
 
+class TopicGroup(NameLookup):
+    lookup_type = "LST_TOPIC_GROUP_NAME"
+    entity_name = "Topic Groups"
 
-class CustomField:
 
-    def __init__(self, lookupApi: LookupApi):
-        self.lookupApi = lookupApi
+class KeywordList(NameLookup):
+    lookup_type = "LST_KEYWORD_LIST_NAME"
+    entity_name = "Keyword Groups"
 
-    def get_id_from_name(self, name):
-        lookup_request = LookupRequest()
-        lookup_request.type("CUSTOM_FIELD_NAME")
-        lookup_request.add_key(name)
-        response_dict = self.lookupApi.lookup(lookup_request)
-        if len(response_dict) != 1:
-            raise RuntimeError("Could not resolve custom field for name: " + name)
-        return list(response_dict.values())[0]
 
+class Country(NameLookup):
+    lookup_type = "LST_COUNTRY_NAME"
+    entity_name = "Countries"
 
-class CustomMeasurement:
 
-    def __init__(self, lookupApi: LookupApi):
-        self.lookupApi = lookupApi
+class CustomField(NameLookup):
+    lookup_type = "CUSTOM_FIELD_NAME"
+    entity_name = "custom field"
 
-    def get_id_from_name(self, name):
-        lookup_request = LookupRequest()
-        lookup_request.type("CUSTOM_METRIC_NAME")
-        lookup_request.add_key(name)
-        response_dict = self.lookupApi.lookup(lookup_request)
-        if len(response_dict) != 1:
-            raise RuntimeError("Could not resolve custom measurement for name: " + name)
-        return list(response_dict.values())[0]
 
+class CustomMeasurement(NameLookup):
+    lookup_type = "CUSTOM_METRIC_NAME"
+    entity_name = "custom measurement"
 
-class ListeningMediaType:
 
-    def __init__(self, lookupApi: LookupApi):
-        self.lookupApi = lookupApi
-
-    def get_id_from_names(self, names):
-        lookup_request = LookupRequest()
-        lookup_request.type("LISTENING_MEDIA_TYPE_NAME")
-        lookup_request.add_keys(names)
-        response_dict = self.lookupApi.lookup(lookup_request)
-        if len(response_dict) != len(names):
-            raise RuntimeError(
-                "Could not resolve all Sources for names. Missing names : " + str(names - response_dict.keys()))
-        return list(response_dict.values())
+class ListeningMediaType(NameLookup):
+    lookup_type = "LISTENING_MEDIA_TYPE_NAME"
+    entity_name = "Sources"
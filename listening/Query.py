@@ -1,9 +1,28 @@
+import asyncio
 import calendar
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from spr_api.listening.NameLookups import Topic, TopicGroup, Theme, KeywordList, Country, CustomField, \
     CustomMeasurement, ListeningMediaType
 from spr_api.reporting.Request import ReportingRequest
+from spr_api.listening.Clauses import FilterClause, GroupClause, ProjectionClause
+from spr_api.listening.Incremental import SeriesStore, refresh_plan, stable_until, DEFAULT_LATE_MARGIN
+from spr_api.listening.QueryExecutor import QueryExecutor
+from spr_api.listening.Sharding import INTERVAL_MILLIS, DAY_MILLIS, time_windows, adaptive_time_windows
+from spr_api.reporting.Checkpoint import Checkpoint, DEFAULT_CHECKPOINT_DIR
+from spr_api.reporting.Compiled import CompiledQuery
+from spr_api.reporting.Columnar import ColumnarResult, TIME, DIMENSION, MEASURE
+from spr_api.reporting.DateColumns import format_date_columns
+from spr_api.reporting.Fingerprint import payload_fingerprint, account_fingerprint, scoped_fingerprint
+from spr_api.reporting.Paging import ReportPages, AsyncReportPages, StreamPages, AsyncStreamPages
+from spr_api.reporting.PageSize import PageSizeTuner, PageSizeHistory, DEFAULT_MIN_PAGE_SIZE, \
+    DEFAULT_MAX_PAGE_SIZE, DEFAULT_TARGET_LATENCY, DEFAULT_TARGET_BYTES
+from spr_api.reporting.Prefetch import prefetch, DEFAULT_PREFETCH_DEPTH
+from spr_api.reporting.ResultCache import default_cache
+from spr_api.reporting.Rows import row_type, to_rows
+from spr_api.reporting.Sinks import open_sink
 from spr_api.reporting.Response import ReportingResponse, StreamResponse
 from spr_api.spr_app import SprApp
 
@@ -45,11 +64,71 @@ class Query(ReportingRequest):
         self.query_projections = []
         self.date_format_columns = []
         self.include_request = False
+        self.raw_dates = False
+        self.records = False
+        self.prefetch_depth = 0
+        self.page_size_tuner = None
+        self.result_cache = None
+        self._pending_lookups = []
+        self._compiled = None
+        self._compiled_key = None
 
     @staticmethod
     def get_millis_from_iso_date(iso_format_string):
         return calendar.timegm(datetime.fromisoformat(iso_format_string).utctimetuple()) * 1000
 
+    def _defer_lookup(self, resolver, names, dimension_name, filter_type):
+        """
+        Records a filter on names which still have to be resolved to ids, see resolve_lookups. A placeholder takes
+        its place in the filters, so the payload lists the filters in the order they were added.
+        """
+        slot = object()
+        self.filters.append(slot)
+        self._pending_lookups.append((resolver, list(names), dimension_name, filter_type, slot))
+
+    def resolve_lookups(self):
+        """
+        Resolves the names recorded by the topic, topic group, theme, keyword list, country and source filters and
+        puts their filters in place of their placeholders. Names are resolved with one lookup call per lookup type
+        and the lookup types are resolved concurrently. Called before the query is fetched, so building a query
+        makes no lookup calls and unknown names are reported when fetching.
+        """
+        if not self._pending_lookups:
+            return self
+        names_by_resolver = {}
+        for resolver, names, _, _, _ in self._pending_lookups:
+            names_by_resolver.setdefault(resolver, {}).update(dict.fromkeys(names))
+
+        def resolve(resolver):
+            names = list(names_by_resolver[resolver])
+            return resolver, dict(zip(names, resolver(self.lookup_api).get_id_from_names(names)))
+
+        if len(names_by_resolver) == 1:
+            ids_by_resolver = dict(map(resolve, names_by_resolver))
+        else:
+            with ThreadPoolExecutor(max_workers=len(names_by_resolver)) as executor:
+                ids_by_resolver = dict(executor.map(resolve, names_by_resolver))
+
+        for resolver, names, dimension_name, filter_type, slot in self._pending_lookups:
+            ids = ids_by_resolver[resolver]
+            self.with_filter_dimension(dimension_name, filter_type, [ids[name] for name in names])
+            # with_filter_dimension appends, the filter is moved to the slot recorded when it was deferred
+            self.filters[self.filters.index(slot)] = self.filters.pop()
+        self._pending_lookups = []
+        return self
+
+    def with_filter_dimension(self, *args, **kwargs):
+        self._compiled = None
+        return super().with_filter_dimension(*args, **kwargs)
+
+    def group_by_dimension(self, *args, **kwargs):
+        self._compiled = None
+        return super().group_by_dimension(*args, **kwargs)
+
+    def project_field(self, *args, **kwargs):
+        self._compiled = None
+        return super().project_field(*args, **kwargs)
+
     def with_topics(self, topics):
         self.__topic_filter(topics, "IN")
         return self
@@ -60,9 +139,8 @@ class Query(ReportingRequest):
 
     def __topic_filter(self, topics, filter_type="IN"):
         not_empty(topics)
-        ids = Topic(self.lookup_api).get_id_from_names(topics)
-        self.query_filters.append({"key": "topic", "operator": filter_type, "values": topics})
-        self.with_filter_dimension("TOPIC_IDS", filter_type, ids)
+        self.query_filters.append(FilterClause("topic", filter_type, topics))
+        self._defer_lookup(Topic, topics, "TOPIC_IDS", filter_type)
         return self
 
     def with_topic_groups(self, topic_groups):
@@ -75,9 +153,8 @@ class Query(ReportingRequest):
 
     def __topic_group_filter(self, topic_groups, filter_type="IN"):
         not_empty(topic_groups)
-        ids = TopicGroup(self.lookup_api).get_id_from_names(topic_groups)
-        self.query_filters.append({"key": "topic_group", "operator": filter_type, "values": topic_groups})
-        self.with_filter_dimension("TOPIC_GROUP_IDS", filter_type, ids)
+        self.query_filters.append(FilterClause("topic_group", filter_type, topic_groups))
+        self._defer_lookup(TopicGroup, topic_groups, "TOPIC_GROUP_IDS", filter_type)
 
     def with_themes(self, themes):
         self.__theme_filter(themes, "IN")
@@ -89,9 +166,8 @@ class Query(ReportingRequest):
 
     def __theme_filter(self, themes, filter_type="IN"):
         not_empty(themes)
-        ids = Theme(self.lookup_api).get_id_from_names(themes)
-        self.query_filters.append({"key": "theme", "operator": filter_type, "values": themes})
-        self.with_filter_dimension("LST_THEME", filter_type, ids)
+        self.query_filters.append(FilterClause("theme", filter_type, themes))
+        self._defer_lookup(Theme, themes, "LST_THEME", filter_type)
         return self
 
     def with_keyword_lists(self, keyword_lists):
@@ -104,9 +180,8 @@ class Query(ReportingRequest):
 
     def __keyword_list_filter(self, keyword_lists, filter_type="IN"):
         not_empty(keyword_lists)
-        ids = KeywordList(self.lookup_api).get_id_from_names(keyword_lists)
-        self.query_filters.append({"key": "keyword_list", "operator": filter_type, "values": keyword_lists})
-        self.with_filter_dimension("LST_KEYWORD_LIST", filter_type, ids)
+        self.query_filters.append(FilterClause("keyword_list", filter_type, keyword_lists))
+        self._defer_lookup(KeywordList, keyword_lists, "LST_KEYWORD_LIST", filter_type)
         return self
 
     def with_topic_tags(self, topic_tags):
@@ -129,7 +204,7 @@ class Query(ReportingRequest):
         not_empty(tags)
         if not isinstance(filter_name, str):
             raise RuntimeError("Please pass valid filter name in string")
-        self.query_filters.append({"key": filter_name.lower(), "operator": filter_type, "values": tags})
+        self.query_filters.append(FilterClause(filter_name.lower(), filter_type, tags))
         self.with_filter_dimension(filter_name, filter_type, tags)
         return self
 
@@ -143,19 +218,18 @@ class Query(ReportingRequest):
 
     def __country_filter(self, countries, filter_type="IN"):
         not_empty(countries)
-        ids = Country(self.lookup_api).get_id_from_names(countries)
-        self.query_filters.append({"key": "country", "operator": filter_type, "values": countries})
-        self.with_filter_dimension("COUNTRY", filter_type, ids)
+        self.query_filters.append(FilterClause("country", filter_type, countries))
+        self._defer_lookup(Country, countries, "COUNTRY", filter_type)
         return self
 
     def with_country_exists(self, value="true"):
-        self.query_filters.append({"key": "country", "operator": "EXISTS", "values": value})
+        self.query_filters.append(FilterClause("country", "EXISTS", value))
         self.with_filter_dimension("COUNTRY", "EXISTS", [value])
         return self
 
     def with_permalinks(self, links):
         not_empty(links)
-        self.query_filters.append({"key": "links", "operator": "IN", "values": links})
+        self.query_filters.append(FilterClause("links", "IN", links))
         self.with_filter_dimension("DOMAINS", "IN", links)
         return self
 
@@ -169,9 +243,8 @@ class Query(ReportingRequest):
 
     def __source_filter(self, sources, filter_type="IN"):
         not_empty(sources)
-        ids = ListeningMediaType(self.lookup_api).get_id_from_names(sources)
-        self.query_filters.append({"key": "sources", "operator": filter_type, "values": sources})
-        self.with_filter_dimension("LISTENING_MEDIA_TYPE", filter_type, ids)
+        self.query_filters.append(FilterClause("sources", filter_type, sources))
+        self._defer_lookup(ListeningMediaType, sources, "LISTENING_MEDIA_TYPE", filter_type)
         return self
 
     def with_sentiments(self, sentiments):
@@ -192,7 +265,7 @@ class Query(ReportingRequest):
             else:
                 raise RuntimeError(
                     "Unknown value. Acceptable values are: [ Positive, Negative, Neutral, Uncategorized ]")
-        self.query_filters.append({"key": "sentiment", "operator": filter_type, "values": sentiments})
+        self.query_filters.append(FilterClause("sentiment", filter_type, sentiments))
         self.with_filter_dimension("SEM_SENTIMENT", filter_type, ids)
         return self
 
@@ -213,7 +286,7 @@ class Query(ReportingRequest):
         not_empty(custom_field_values)
         custom_property_dimension = ASSET_CLASS_TO_CUSTOM_PROPERTY_DIMENSION_MAP.get(asset_class)
         custom_field_id = CustomField(self.lookup_api).get_id_from_name(custom_field_name)
-        self.query_filters.append({"key": custom_field_id, "operator": filter_type, "values": custom_field_values})
+        self.query_filters.append(FilterClause(custom_field_id, filter_type, custom_field_values))
         self.with_filter_dimension(custom_property_dimension, filter_type, custom_field_values,
                                    {'contentType': 'DB_FILTER', 'fieldName': custom_field_id,
                                     'reportName': 'SPRINKSIGHTS', 'srcType': 'CUSTOM'})
@@ -229,17 +302,17 @@ class Query(ReportingRequest):
 
     def __spam_category_filter(self, categories, filter_type):
         not_empty(categories)
-        self.query_filters.append({"key": "spam category", "operator": filter_type, "values": categories})
+        self.query_filters.append(FilterClause("spam category", filter_type, categories))
         self.with_filter_dimension("SPAM_CAT", filter_type, categories)
         return self
 
     def group_by_topic(self, heading="Topics"):
-        self.query_groups.append({"key": "topic", "heading": heading})
+        self.query_groups.append(GroupClause("topic", heading))
         self.group_by_dimension(heading, "TOPIC_IDS")
         return self
 
     def group_by_theme(self, heading="Themes"):
-        self.query_groups.append({"key": "theme", "heading": heading})
+        self.query_groups.append(GroupClause("theme", heading))
         self.group_by_dimension(heading, "LST_THEME")
         return self
 
@@ -247,7 +320,7 @@ class Query(ReportingRequest):
         if not isinstance(topic_tag, str):
             raise RuntimeError("Please pass valid topic tag name in string")
         field_name = "SPECIFIC_TOPIC_TAG_" + topic_tag
-        self.query_groups.append({"key": field_name, "heading": heading})
+        self.query_groups.append(GroupClause(field_name, heading))
         self.group_by_dimension(heading, field_name)
         return self
 
@@ -255,65 +328,71 @@ class Query(ReportingRequest):
         if not isinstance(theme_tag, str):
             raise RuntimeError("Please pass valid theme tag name in string")
         field_name = "SPECIFIC_THEME_TAG_" + theme_tag
-        self.query_groups.append({"key": field_name, "heading": heading})
+        self.query_groups.append(GroupClause(field_name, heading))
         self.group_by_dimension(heading, field_name)
         return self
 
     def group_by_sentiment(self, heading="Sentiment"):
-        self.query_groups.append({"key": "sentiment", "heading": heading})
+        self.query_groups.append(GroupClause("sentiment", heading))
         self.group_by_dimension(heading, "SEM_SENTIMENT")
         return self
 
     def group_by_day_of_week(self, heading="Day Of Week"):
-        self.query_groups.append({"key": "day_of_week", "heading": heading})
+        self.query_groups.append(GroupClause("day_of_week", heading))
         self.group_by_dimension(heading, "DAY_OF_WEEK")
         return self
 
     def group_by_time_of_day(self, heading="Time Of Day"):
-        self.query_groups.append({"key": "time_of_day", "heading": heading})
+        self.query_groups.append(GroupClause("time_of_day", heading))
         self.group_by_dimension(heading, "TIME_OF_DAY")
         return self
 
     def group_by_created_hour(self, heading="Hour", format="%Y-%m-%d %H:%M"):
+        """
+        Groups by the hour of creation, formatted with the strftime format. Pass format=None to get epoch millis.
+        """
         self.date_format_columns.append((len(self.query_groups), format))
-        self.query_groups.append({"key": "created_hour", "heading": heading})
+        self.query_groups.append(GroupClause("created_hour", heading))
         self.group_by_dimension(heading, "SN_CREATED_TIME", "DATE_HISTOGRAM", {'interval': '1h'})
         return self
 
     def group_by_created_date(self, heading="Date", format="%Y-%m-%d"):
+        """
+        Groups by the date of creation, formatted with the strftime format. Pass format=None to get epoch millis.
+        """
         self.date_format_columns.append((len(self.query_groups), format))
-        self.query_groups.append({"key": "created_date", "heading": heading})
+        self.query_groups.append(GroupClause("created_date", heading))
         self.group_by_dimension(heading, "SN_CREATED_TIME", "DATE_HISTOGRAM", {'interval': '1d'})
         return self
 
     def group_by_source(self, heading="Source"):
-        self.query_groups.append({"key": "source", "heading": heading})
+        self.query_groups.append(GroupClause("source", heading))
         self.group_by_dimension(heading, "LISTENING_MEDIA_TYPE")
         return self
 
     def group_by_country(self, heading="Country"):
-        self.query_groups.append({"key": "country", "heading": heading})
+        self.query_groups.append(GroupClause("country", heading))
         self.group_by_dimension(heading, "COUNTRY")
         return self
 
     def group_by_hashtag(self, heading="Hashtags"):
-        self.query_groups.append({"key": "hashtag", "heading": heading})
+        self.query_groups.append(GroupClause("hashtag", heading))
         self.group_by_dimension(heading, "HASHTAGS")
         return self
 
     def group_by_domain(self, heading="Domain"):
-        self.query_groups.append({"key": "domain", "heading": heading})
+        self.query_groups.append(GroupClause("domain", heading))
         self.group_by_dimension(heading, "DOMAINS")
         return self
 
     def project_mentions(self, heading, aggregate_function="SUM"):
-        self.query_projections.append({"key": "mentions", "heading": heading})
+        self.query_projections.append(ProjectionClause("mentions", heading))
         self.project_field(heading, "MENTIONS_COUNT", aggregate_function)
         return self
 
     def project_custom_measurement(self, heading, measurement_name, aggregate_function="SUM"):
         id = CustomMeasurement(self.lookup_api).get_id_from_name(measurement_name)
-        self.query_projections.append({"key": id, "heading": heading})
+        self.query_projections.append(ProjectionClause(id, heading))
         self.project_field(heading, id, aggregate_function)
         return self
 
@@ -321,14 +400,84 @@ class Query(ReportingRequest):
         self.include_request = True
         return self
 
-    def fetch(self):
-        payload = {
+    def with_raw_dates(self):
+        """
+        Returns the created date/hour groups as epoch millis, without formatting them.
+        """
+        self.raw_dates = True
+        return self
+
+    def with_records(self):
+        """
+        Returns the rows of fetch_all_with_time_groups, fetch_sharded, fetch_incremental and stream_rows as
+        immutable, tuple backed Rows read by index, heading or attribute (see spr_api.reporting.Rows), instead
+        of lists. They take less memory than lists and far less than dicts.
+        """
+        self.records = True
+        return self
+
+    def with_prefetch(self, depth=DEFAULT_PREFETCH_DEPTH):
+        """
+        Fetches up to depth pages ahead (on a background thread, or a task for the async fetches) while the current
+        page is processed, for fetch_mentions, fetch_columnar, the async fetches and the fetch_all_with_time_groups
+        family. 0 disables it.
+        """
+        self.prefetch_depth = depth
+        return self
+
+    def with_adaptive_page_size(self, seed=None, min_size=DEFAULT_MIN_PAGE_SIZE, max_size=DEFAULT_MAX_PAGE_SIZE,
+                                target_latency=DEFAULT_TARGET_LATENCY, target_bytes=DEFAULT_TARGET_BYTES,
+                                history=True):
+        """
+        Adapts the page size while the report is fetched: it is doubled while pages come back well under
+        target_latency seconds and target_bytes bytes, and halved when a page goes over them or fails with a
+        timeout or 5xx (the page is then retried). Applies to fetch_async and the fetch_all_with_time_groups
+        family, every one of them starts from the settings below with its own state. fetch does not use it and the
+        fetch_mentions family, paged by the stream cursor, rejects it.
+        Parameters
+        ----------
+        seed : first page size, defaults to page_size
+        min_size, max_size : bounds of the page size
+        target_latency, target_bytes : see spr_api.reporting.PageSize.PageSizeTuner
+        history : True to start from, and record, the best known size of this query shape in
+                  ~/.sprinklr/page_sizes.json, a PageSizeHistory to keep them elsewhere, False to not keep them
+        """
+        if history is True:
+            history = PageSizeHistory()
+        self.page_size_tuner = PageSizeTuner(seed or self.page_size, min_size, max_size, target_latency,
+                                             target_bytes, history or None)
+        return self
+
+    def with_cache(self, cache=True):
+        """
+        Answers the query from a result cache when an identical query (same payload, time range included) was
+        fetched with the same env/key within the cache ttl, and caches the result otherwise. Applies to fetch,
+        fetch_columnar, fetch_sharded (per window), export and the fetch_all_with_time_groups family.
+        Parameters
+        ----------
+        cache : True for the ResultCache in ~/.sprinklr/cache shared by the queries of the process, a
+                spr_api.reporting.ResultCache.ResultCache to configure its tiers and ttls, False to disable it
+        """
+        self.result_cache = default_cache() if cache is True else cache or None
+        return self
+
+    def _date_formats(self):
+        """
+        Returns the (column index, format) pairs of the date columns which have to be formatted.
+        """
+        if self.raw_dates:
+            return []
+        return [(column, date_format) for column, date_format in self.date_format_columns if date_format is not None]
+
+    def _clauses(self):
+        """
+        Returns what the payload is compiled from besides the time range and page size, the clauses as serialised
+        by their asdict().
+        """
+        return {
             "reportingEngine": "LISTENING",
             "report": "SPRINKSIGHTS",
-            "startTime": self.start_time,
-            "endTime": self.end_time,
             "timeZone": "UTC",
-            "pageSize": self.page_size,
             "jsonResponse": self.json_response,
             "groupBys": [group_by.asdict() for group_by in self.group_bys],
             "projections": [projection.asdict() for projection in self.projections],
@@ -336,61 +485,468 @@ class Query(ReportingRequest):
             "sorts": [sort.asdict() for sort in self.sorts],
             "additional": self.additional
         }
-        request = {
-            "filters": self.query_filters,
-            "groups": self.query_groups,
-            "projections": self.query_projections,
+
+    def _clauses_key(self):
+        """
+        Returns what compile checks its CompiledQuery against, without serialising anything: the clause objects
+        and additional members, so clauses added, removed or replaced other than by a builder are noticed too.
+        """
+        return (self.json_response, tuple(self.group_bys), tuple(self.projections), tuple(self.filters),
+                tuple(self.sorts), tuple(self.additional.items()))
+
+    def compile(self):
+        """
+        Returns the CompiledQuery of the query: its reports/query payload serialised once, with its fingerprint.
+        It is kept until a builder changes the clauses; a change of time range or page size (e.g. the windows of
+        fetch_sharded) reuses the serialised clauses.
+        """
+        self.resolve_lookups()
+        key = self._clauses_key()
+        compiled = self._compiled
+        if compiled is None or key != self._compiled_key:
+            compiled = CompiledQuery(self._clauses(), self.start_time, self.end_time, self.page_size, self.app.codec)
+            self._compiled_key = key
+        else:
+            if (compiled.start_time, compiled.end_time) != (self.start_time, self.end_time):
+                compiled = compiled.with_time_range(self.start_time, self.end_time)
+            if compiled.page_size != self.page_size:
+                compiled = compiled.with_page_size(self.page_size)
+        self._compiled = compiled
+        return compiled
+
+    def _payload(self):
+        return self.compile().payload()
+
+    def _request(self):
+        return {
+            "filters": [clause.asdict() for clause in self.query_filters],
+            "groups": [clause.asdict() for clause in self.query_groups],
+            "projections": [clause.asdict() for clause in self.query_projections],
             "page_size": self.page_size
         }
-        return ReportingResponse(self.app, request, payload, self.date_format_columns, self.include_request)
+
+    def fetch(self):
+        if self.result_cache is not None:
+            compiled = self.compile()
+            request = self._request() if self.include_request else None
+            return self.result_cache.pages(compiled, lambda: self._fetch_pages(compiled), self._date_formats(),
+                                           request, self._account())
+        return ReportingResponse(self.app, self._request(), self._payload(), self._date_formats(),
+                                 self.include_request)
+
+    def _account(self):
+        """
+        Returns the fingerprint of the env/key of the app, results kept on disk are scoped to it.
+        """
+        return account_fingerprint(self.app.spr_auth.env, self.app.spr_auth.key)
+
+    def _tuner(self):
+        """
+        Returns a new PageSizeTuner for one pagination, None without with_adaptive_page_size.
+        """
+        return self.page_size_tuner.fresh() if self.page_size_tuner is not None else None
+
+    def _fetch_raw(self):
+        """
+        Same as fetch, but date columns are returned as epoch millis.
+        """
+        compiled = self.compile()
+        if self.result_cache is not None:
+            return self.result_cache.pages(compiled, lambda: self._fetch_pages(compiled), scope=self._account())
+        return self._fetch_pages(compiled)
+
+    def _fetch_pages(self, compiled):
+        """
+        Pages of a CompiledQuery from the api, with the date columns as epoch millis.
+        """
+        if self.page_size_tuner is not None:
+            return ReportPages(self.app, compiled, [], tuner=self._tuner())
+        return ReportingResponse(self.app, self._request(), compiled.payload(), [], False)
+
+    def _raw_pages(self):
+        """
+        Pages of _fetch_raw, read ahead when with_prefetch was used.
+        """
+        pages = self._fetch_raw()
+        return prefetch(pages, self.prefetch_depth) if self.prefetch_depth else pages
+
+    def fetch_async(self, app):
+        """
+        Async version of fetch, returns an async iterator over the pages of the report.
+        Parameters
+        ----------
+        app : an instance of AsyncSprApp
+        """
+        request = self._request() if self.include_request else None
+        return AsyncReportPages(app, self.compile(), self._date_formats(), request,
+                                prefetch_depth=self.prefetch_depth, tuner=self._tuner())
+
+    def stream_rows(self, on_headings=None):
+        """
+        Yields the rows of the report one at a time. Each page is parsed incrementally from the socket instead of
+        after its whole body was downloaded, so time to first row and peak memory do not grow with page_size.
+        Requires ijson. If a response has its headings after its rows, the rows are held until the headings were
+        parsed, so on_headings and with_records always see the headings.
+
+        Parameters
+        ----------
+        on_headings : called with the headings of the report before its first row
+        """
+        pages = ReportPages(self.app, self.compile(), self._date_formats())
+        held = []
+        make = None
+
+        def convert(rows):
+            nonlocal make
+            if not self.records:
+                return rows
+            make = make or row_type(pages.headings or [])
+            return map(make, rows)
+
+        for row in pages.iter_rows():
+            if pages.headings is None:
+                held.append(row)
+                continue
+            if on_headings is not None:
+                on_headings(list(pages.headings))
+                on_headings = None
+            if held:
+                yield from convert(held)
+                held = []
+            yield from convert((row,))
+        if on_headings is not None:
+            on_headings(list(pages.headings or []))
+        yield from convert(held)
 
     def fetch_all_with_time_groups(self):
+        overall_response = {'rows': [], 'headings': []}
+        for batch in self.stream_all_with_time_groups():
+            if 'headings' in batch:
+                overall_response['headings'].extend(batch['headings'])
+            if 'request' in batch:
+                overall_response['request'] = batch['request']
+            if 'rows' in batch:
+                rows = batch['rows']
+                # converted page by page, the rows of the whole result are never held twice
+                overall_response['rows'].extend(to_rows(overall_response['headings'], rows) if self.records
+                                                else rows)
+        return overall_response
+
+    def stream_all_with_time_groups(self):
+        """
+        Generator version of fetch_all_with_time_groups, memory is bounded by the page size instead of the result
+        size. The first item is {'headings': [...]} (plus 'request' when with_request was used), every following
+        item is {'rows': [...]} holding the rows of one page as it arrives.
+        """
         if not self.group_bys:
             raise RuntimeError("fetch_all_date_groups only works with groups involving data or time, "
                                "eg: group_by_created_date, group_by_created_hour")
-        group_by = [group_by.asdict() for group_by in self.group_bys]
-        time_group_exists = False
-        for group in group_by:
-            if 'dimensionName' in group:
-                if group['dimensionName'] == 'SN_CREATED_TIME':
-                    time_group_exists = True
-                    break
-        if not time_group_exists:
+        if self._time_group_interval() is None:
             raise RuntimeError("fetch_all_date_groups only works with groups involving data or time, eg: group_by_created_date, "
                                "group_by_created_hour")
-        response = self.fetch()
-        overall_response = {'rows': [], 'headings': []}
+        yield from self._stream_pages()
+
+    def _stream_pages(self):
+        """
+        Yields {'headings': [...]} (plus 'request'), then {'rows': [...]} per page with the dates formatted. The
+        headings are those of the first page which has any, the rows of pages before it are held back until then.
+        """
+        date_formats = self._date_formats()
+        held = []
+        headings_sent = False
+
+        def head(headings):
+            item = {'headings': list(headings or [])}
+            if self.include_request:
+                item['request'] = self._request()
+            return item
+
+        # dates are formatted here, one batch per page
+        for res in self._raw_pages():
+            rows = format_date_columns(res['rows'], date_formats) if res.get('rows') else None
+            if not headings_sent and not res.get('headings'):
+                if rows:
+                    held.append(rows)
+                continue
+            if not headings_sent:
+                yield head(res['headings'])
+                headings_sent = True
+                for batch in held:
+                    yield {'rows': batch}
+                held = []
+            if rows:
+                yield {'rows': rows}
+        if not headings_sent:
+            yield head([])
+            for batch in held:
+                yield {'rows': batch}
+
+    def write_all_with_time_groups(self, sink):
+        """
+        Streams the result of fetch_all_with_time_groups into sink page by page, see spr_api.reporting.Sinks.
+        Returns the no of rows written.
+        """
+        return self._write(sink, self.stream_all_with_time_groups())
 
-        for res in response:
-            if 'rows' in res:
-                overall_response['rows'].extend(res['rows'])
-            if 'headings' in res and len(overall_response['headings']) == 0:
-                overall_response['headings'].extend(res['headings'])
+    def export(self, path, format=None, compression="infer", **options):
+        """
+        Writes all rows of the report to a file page by page as they arrive, so memory does not grow with the
+        result size. Dates are formatted as for fetch (kept as epoch millis with with_raw_dates).
+        Returns the no of rows written.
+        Parameters
+        ----------
+        path : file to write
+        format : "csv", "jsonl" or "parquet" (one row group per page, requires pyarrow), inferred from the suffix
+                 of path when not passed, e.g. report.csv.gz
+        compression : "gzip", "bz2" or "xz" for csv and jsonl, a parquet codec for parquet (default snappy), None
+                      for no compression, or "infer" to pick it from the suffix of path
+        options : passed to the sink, see spr_api.reporting.Sinks
+        """
+        if format == "parquet" or (format is None and ".parquet" in str(path).lower()):
+            options.setdefault("kinds", self._column_kinds())
+        options.setdefault("codec", self.app.codec)
+        return self._write(open_sink(path, format, compression, **options), self._stream_pages())
 
-        if self.include_request:
-            overall_response['request'] = response.request
-        return overall_response
+    @staticmethod
+    def _write(sink, batches):
+        rows_written = 0
+        with sink:
+            for batch in batches:
+                if 'headings' in batch:
+                    sink.write_headings(batch['headings'])
+                if 'rows' in batch:
+                    sink.write_rows(batch['rows'])
+                    rows_written += len(batch['rows'])
+        return rows_written
+
+    def _column_kinds(self):
+        """
+        Returns the Columnar kind of every column of the report: group bys followed by projections.
+        """
+        kinds = [TIME if group_by.asdict().get('dimensionName') == 'SN_CREATED_TIME' else DIMENSION
+                 for group_by in self.group_bys]
+        return kinds + [MEASURE] * len(self.projections)
 
-    def fetch_mentions(self):
+    def fetch_columnar(self):
+        """
+        Fetches all pages into a ColumnarResult: created time groups as int64 epoch millis, other groups dictionary
+        encoded and projections as int64/float64. Use its to_numpy, to_pandas or to_arrow to export the result.
+        """
+        headings = [group_by.asdict().get('heading') for group_by in self.group_bys]
+        headings += [projection.asdict().get('heading') for projection in self.projections]
+        result = ColumnarResult(headings, self._column_kinds())
+        for page in self._raw_pages():
+            result.append_rows(page.get('rows') or [])
+        return result
+
+    def _prepare_mentions(self):
         if self.projections:
             raise RuntimeError("fetchMentions does not support projections")
         elif self.group_bys:
             raise RuntimeError("fetchMentions does not support groups")
+        elif self.page_size_tuner is not None:
+            raise RuntimeError("fetchMentions does not support adaptive page sizes, the stream is paged by its cursor")
         self.group_by_dimension("Message Id", "ES_MESSAGE_ID")
         self.project_mentions("Mentions")
         self.additional["STREAM"] = True
-        payload = {
-            "reportingEngine": "LISTENING",
-            "report": "SPRINKSIGHTS",
-            "startTime": self.start_time,
-            "endTime": self.end_time,
-            "timeZone": "UTC",
-            "pageSize": self.page_size,
-            "jsonResponse": self.json_response,
-            "groupBys": [group_by.asdict() for group_by in self.group_bys],
-            "projections": [projection.asdict() for projection in self.projections],
-            "filters": [filter.asdict() for filter in self.filters],
-            "sorts": [sort.asdict() for sort in self.sorts],
-            "additional": self.additional
-        }
-        return StreamResponse(self.app, payload)
+
+    def fetch_mentions(self, checkpoint=None):
+        """
+        Returns a StreamResponse over the pages of the stream report, read ahead when with_prefetch is set.
+        Parameters
+        ----------
+        checkpoint : directory to checkpoint the export in, or True for ~/.sprinklr/checkpoints. A StreamPages
+                     exposing page, rows_emitted, cursor and resumed is returned instead: the stream cursor and the
+                     no of pages and rows emitted are saved after every page, and a later call for the same query
+                     (same payload and env/key) resumes at the saved cursor.
+        """
+        self._prepare_mentions()
+        if checkpoint is None:
+            pages = StreamResponse(self.app, self._payload())
+            return prefetch(pages, self.prefetch_depth) if self.prefetch_depth else pages
+        compiled = self.compile()
+        directory = DEFAULT_CHECKPOINT_DIR if checkpoint is True else checkpoint
+        # the same query of another account has its own checkpoint
+        fingerprint = scoped_fingerprint(self._account(), payload_fingerprint(compiled.payload()))
+        return StreamPages(self.app, compiled, Checkpoint(fingerprint, directory), self.prefetch_depth)
+
+    async def fetch_mentions_async(self, app):
+        """
+        Async version of fetch_mentions, an async generator over the pages of the stream report, fetched with app
+        following the stream cursor (see spr_api.reporting.Paging.AsyncStreamPages). The lookups are resolved on
+        the default executor of the running loop, so the event loop is never blocked by them.
+        Parameters
+        ----------
+        app : an instance of AsyncSprApp
+        """
+        self._prepare_mentions()
+        compiled = await asyncio.get_running_loop().run_in_executor(None, self.compile)
+        async for page in AsyncStreamPages(app, compiled, prefetch_depth=self.prefetch_depth):
+            yield page
+
+    def _clone(self):
+        clone = copy.copy(self)
+        for name in ("filters", "group_bys", "projections", "sorts", "query_filters", "query_groups",
+                     "query_projections", "date_format_columns", "_pending_lookups"):
+            setattr(clone, name, list(getattr(self, name)))
+        clone.additional = dict(self.additional)
+        clone._compiled = None
+        return clone
+
+    def _with_time_window(self, start_time, end_time):
+        compiled = self.compile()
+        clone = self._clone()
+        clone.start_time = start_time
+        clone.end_time = end_time
+        # same clauses as this query, the window shares their serialisation
+        clone._compiled = compiled.with_time_range(start_time, end_time)
+        clone._compiled_key = clone._clauses_key()
+        return clone
+
+    def _time_group_column(self):
+        """
+        Returns the column index of the created time group of the query, None if it has no time group.
+        """
+        for column, group_by in enumerate(self.group_bys):
+            if group_by.asdict().get('dimensionName') == 'SN_CREATED_TIME':
+                return column
+        return None
+
+    def _time_group_interval(self):
+        """
+        Returns the bucket size in millis of the created time group of the query, None if it has no time group.
+        """
+        for group_by in self.group_bys:
+            group = group_by.asdict()
+            if group.get('dimensionName') == 'SN_CREATED_TIME':
+                return INTERVAL_MILLIS.get((group.get('details') or {}).get('interval'), DAY_MILLIS)
+        return None
+
+    def _mention_counts(self):
+        """
+        Returns the daily mentions histogram of the query filters as a list of (day in epoch millis, mentions).
+        """
+        counts = self._clone()
+        counts.group_bys, counts.projections, counts.sorts = [], [], []
+        counts.query_groups, counts.query_projections, counts.date_format_columns = [], [], []
+        counts.additional = {}
+        counts.group_by_dimension("Date", "SN_CREATED_TIME", "DATE_HISTOGRAM", {'interval': '1d'})
+        counts.project_field("Mentions", "MENTIONS_COUNT", "SUM")
+        return sorted((row[0], row[1] or 0) for page in counts._fetch_raw() for row in page.get('rows') or [])
+
+    def _fetch_shards(self, shards, target_mentions, max_workers, align, fetch):
+        """
+        Splits the time range into windows, fixed or holding about target_mentions mentions each, and returns the
+        pages of all windows in time order. Windows are fetched in parallel, one query per window.
+        """
+        self.resolve_lookups()
+        if target_mentions is not None:
+            windows = adaptive_time_windows(self.start_time, self.end_time, self._mention_counts(), target_mentions)
+        else:
+            windows = time_windows(self.start_time, self.end_time, shards, align)
+        shard_queries = [self._with_time_window(start_time, end_time) for start_time, end_time in windows]
+        max_workers = max_workers or len(shard_queries)
+        executor = QueryExecutor(max_workers=max_workers, max_per_key=max_workers, fetch=fetch)
+        pages = []
+        for result in executor.run(shard_queries, ordered=True):
+            if not result.ok:
+                raise result.error
+            pages.extend(result.pages)
+        return pages
+
+    def fetch_sharded(self, shards=4, target_mentions=None, max_workers=None):
+        """
+        Same result as fetch_all_with_time_groups, but the time range is split into windows which are fetched in
+        parallel. Rows of all windows are merged back in time order.
+        Parameters
+        ----------
+        shards : no of equal windows the time range is split into, windows are aligned to the time group buckets
+        target_mentions : when passed, windows are sized from a daily mentions count of the query so each one holds
+                          about target_mentions mentions, shards is then ignored
+        max_workers : max no of windows fetched at the same time, defaults to all of them
+        """
+        interval = self._time_group_interval()
+        if interval is None:
+            raise RuntimeError("fetch_sharded only works with groups involving data or time, "
+                               "eg: group_by_created_date, group_by_created_hour")
+        pages = self._fetch_shards(shards, target_mentions, max_workers, interval,
+                                   lambda query: list(query._fetch_raw()))
+        overall_response = {'rows': [], 'headings': []}
+        for page in pages:
+            overall_response['rows'].extend(page.get('rows') or [])
+            if page.get('headings') and len(overall_response['headings']) == 0:
+                overall_response['headings'].extend(page['headings'])
+
+        # windows are merged on the raw epoch millis, dates are formatted afterwards
+        time_columns = [column for column, _ in self.date_format_columns]
+        overall_response['rows'].sort(key=lambda row: [(row[column] is None, row[column] or 0)
+                                                       for column in time_columns])
+        format_date_columns(overall_response['rows'], self._date_formats())
+        if self.records:
+            overall_response['rows'] = to_rows(overall_response['headings'], overall_response['rows'])
+        if self.include_request:
+            overall_response['request'] = self._request()
+        return overall_response
+
+    def fetch_incremental(self, store=True, late_margin=DEFAULT_LATE_MARGIN):
+        """
+        Same result as fetch_all_with_time_groups, but the result is kept in store and a later call for the same
+        query (same filters, groups and projections, any time range) only fetches the buckets from the last stable
+        bucket of the stored result to end_time, and merges them into it. Buckets which ended more than
+        late_margin seconds before the previous call are stable. For a rolling window (e.g. the last 90 days,
+        refreshed every 15 minutes) each refresh then costs about the same whatever the lookback. Everything is
+        fetched again when the range starts before the stored one or there is a gap between them.
+        Parameters
+        ----------
+        store : True for a SeriesStore in ~/.sprinklr/series, a spr_api.listening.Incremental.SeriesStore to keep
+                the results elsewhere (SeriesStore(None) keeps them in memory). Results are stored per env/key.
+        late_margin : seconds in which mentions may still be indexed after their creation time
+        """
+        interval = self._time_group_interval()
+        if interval is None:
+            raise RuntimeError("fetch_incremental only works with groups involving data or time, "
+                               "eg: group_by_created_date, group_by_created_hour")
+        if store is True:
+            store = SeriesStore()
+        time_column = self._time_group_column()
+        # the same query of another account has its own series
+        shape = scoped_fingerprint(self._account(), self.compile().shape)
+        state = store.load(shape)
+        windows, rows = refresh_plan(state, self.start_time, self.end_time, interval)
+        headings = state["headings"] if state is not None else []
+        for start_time, end_time in windows:
+            for page in self._with_time_window(start_time, end_time)._fetch_raw():
+                rows.extend(page.get('rows') or [])
+                if page.get('headings'):
+                    headings = list(page['headings'])
+        rows.sort(key=lambda row: (row[time_column] is None, row[time_column] or 0))
+        store.save(shape, {"start_time": self.start_time, "end_time": self.end_time, "interval": interval,
+                           "stable_until": stable_until(self.end_time, interval, late_margin),
+                           "time_column": time_column, "headings": headings, "rows": rows})
+
+        # the stored rows keep the epoch millis
+        rows = format_date_columns([list(row) for row in rows], self._date_formats())
+        overall_response = {'rows': to_rows(headings, rows) if self.records else rows, 'headings': list(headings)}
+        if self.include_request:
+            overall_response['request'] = self._request()
+        return overall_response
+
+    def fetch_mentions_sharded(self, shards=4, target_mentions=None, max_workers=None):
+        """
+        Same rows as fetch_mentions, but the time range is split into windows which are streamed in parallel.
+        Rows are returned in window order, a message id returned by more than one window is kept once.
+        Parameters
+        ----------
+        shards, target_mentions, max_workers : see fetch_sharded
+        """
+        self._prepare_mentions()
+        pages = self._fetch_shards(shards, target_mentions, max_workers, DAY_MILLIS,
+                                   lambda query: list(StreamResponse(query.app, query._payload())))
+        rows_by_message_id = {}
+        headings = []
+        for page in pages:
+            for row in page.get('rows') or []:
+                rows_by_message_id.setdefault(row[0], row)
+            if page.get('headings') and not headings:
+                headings = list(page['headings'])
+        return {'rows': list(rows_by_message_id.values()), 'headings': headings}
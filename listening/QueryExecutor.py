@@ -0,0 +1,158 @@
+import asyncio
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from spr_api.lookup_api import LookupApi
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_PER_KEY = 4
+
+
+class QueryResult:
+    """
+    Outcome of one query run by an executor. pages holds the fetched pages when the query succeeded, error the
+    exception raised by it otherwise. elapsed does not include the time spent waiting for a concurrency slot.
+    """
+
+    def __init__(self, index, query, pages=None, error=None, started_at=None, elapsed=None):
+        self.index = index
+        self.query = query
+        self.pages = pages
+        self.error = error
+        self.started_at = started_at
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def rows(self):
+        if not self.ok:
+            raise self.error
+        return [row for page in self.pages for row in page.get('rows') or []]
+
+    def __repr__(self):
+        status = "ok" if self.ok else "error: {!r}".format(self.error)
+        return "QueryResult(index={}, pages={}, elapsed={:.3f}s, {})".format(
+            self.index, len(self.pages) if self.pages is not None else 0, self.elapsed or 0, status)
+
+
+def _key(app):
+    return app.spr_auth.env, app.spr_auth.key
+
+
+def _share_app(queries, app):
+    """
+    Returns the queries, as clones using app when it is passed, so the queries of the caller are not modified.
+    """
+    if app is None:
+        return queries
+    shared = []
+    for query in queries:
+        query = query._clone() if hasattr(query, "_clone") else copy.copy(query)
+        query.app = app
+        query.lookup_api = LookupApi(app)
+        shared.append(query)
+    return shared
+
+
+class QueryExecutor:
+    """
+    Runs the paginations of many queries in parallel on a thread pool.
+    """
+
+    def __init__(self, app=None, max_workers=DEFAULT_MAX_WORKERS, max_per_key=DEFAULT_MAX_PER_KEY, fetch=None):
+        """
+        Parameters
+        ----------
+        app : an instance of SprApp, when passed all queries share its connections and token
+        max_workers : max no of queries running at the same time
+        max_per_key : max no of queries running at the same time for one env/key
+        fetch : callable returning the pages of a query, defaults to iterating query.fetch()
+        """
+        self.app = app
+        self.max_workers = max_workers
+        self.max_per_key = max_per_key
+        self.fetch = fetch if fetch is not None else lambda query: list(query.fetch())
+        self._key_limits = {}
+        self._lock = threading.Lock()
+
+    def _key_limit(self, app):
+        with self._lock:
+            if _key(app) not in self._key_limits:
+                self._key_limits[_key(app)] = threading.BoundedSemaphore(self.max_per_key)
+            return self._key_limits[_key(app)]
+
+    def _run_one(self, index, query):
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            with self._key_limit(query.app):
+                started_at, start = time.time(), time.perf_counter()
+                pages = self.fetch(query)
+        except Exception as e:
+            return QueryResult(index, query, error=e, started_at=started_at, elapsed=time.perf_counter() - start)
+        return QueryResult(index, query, pages=pages, started_at=started_at, elapsed=time.perf_counter() - start)
+
+    def run(self, queries, ordered=False):
+        """
+        Runs the queries and yields a QueryResult for each of them, in the order of queries when ordered is True
+        and as soon as each query finishes otherwise. A failing query does not stop the others, its error is
+        returned in its QueryResult. When the caller stops iterating, the queries not started yet are cancelled
+        and the running ones finish in the background. With app, QueryResult.query is the clone of the query run
+        with app.
+        """
+        queries = _share_app(list(queries), self.app)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = [executor.submit(self._run_one, index, query) for index, query in enumerate(queries)]
+            for future in (futures if ordered else as_completed(futures)):
+                yield future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncQueryExecutor:
+    """
+    Runs the paginations of many queries concurrently on one event loop.
+    """
+
+    def __init__(self, app, max_workers=DEFAULT_MAX_WORKERS, max_per_key=DEFAULT_MAX_PER_KEY):
+        """
+        Parameters
+        ----------
+        app : an instance of AsyncSprApp used for all queries
+        max_workers : max no of queries running at the same time
+        max_per_key : max no of queries running at the same time for one env/key
+        """
+        self.app = app
+        self.max_workers = max_workers
+        self.max_per_key = max_per_key
+
+    async def _run_one(self, index, query, limit, key_limits):
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            async with limit, key_limits.setdefault(_key(query.app), asyncio.Semaphore(self.max_per_key)):
+                started_at, start = time.time(), time.perf_counter()
+                # names are resolved with blocking lookup calls, keep them off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, query.resolve_lookups)
+                pages = [page async for page in query.fetch_async(self.app)]
+        except Exception as e:
+            return QueryResult(index, query, error=e, started_at=started_at, elapsed=time.perf_counter() - start)
+        return QueryResult(index, query, pages=pages, started_at=started_at, elapsed=time.perf_counter() - start)
+
+    async def run(self, queries, ordered=False):
+        """
+        Async generator version of QueryExecutor.run.
+        """
+        limit = asyncio.Semaphore(self.max_workers)
+        key_limits = {}
+        tasks = [asyncio.ensure_future(self._run_one(index, query, limit, key_limits))
+                 for index, query in enumerate(queries)]
+        try:
+            for task in (tasks if ordered else asyncio.as_completed(tasks)):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,45 @@
+HOUR_MILLIS = 60 * 60 * 1000
+DAY_MILLIS = 24 * HOUR_MILLIS
+
+INTERVAL_MILLIS = {'1h': HOUR_MILLIS, '1d': DAY_MILLIS}
+
+
+def _windows_from_cuts(start_time, end_time, cuts):
+    """
+    Returns the (start, end) windows between the cut points, end times are inclusive so a window ends 1 ms before
+    the next one starts.
+    """
+    bounds = [start_time] + sorted(cut for cut in set(cuts) if start_time < cut <= end_time) + [end_time + 1]
+    return [(window_start, window_end - 1) for window_start, window_end in zip(bounds, bounds[1:])]
+
+
+def time_windows(start_time, end_time, shards, align=DAY_MILLIS):
+    """
+    Splits [start_time, end_time] (epoch millis) into at most shards consecutive windows of about equal length.
+    Windows start on multiples of align, so no time bucket of that size is split between two windows.
+    """
+    if shards < 1:
+        raise ValueError("shards should be at least 1")
+    aligned_start = start_time - start_time % align
+    buckets = -(-(end_time + 1 - aligned_start) // align)
+    step = -(-buckets // shards) * align
+    return _windows_from_cuts(start_time, end_time, range(aligned_start + step, end_time + 1, step))
+
+
+def adaptive_time_windows(start_time, end_time, counts, target_mentions):
+    """
+    Splits [start_time, end_time] into windows holding about target_mentions mentions each.
+
+    Parameters
+    ----------
+    counts : list of (bucket start in epoch millis, mentions) in time order, e.g. a daily mentions histogram
+    target_mentions : no of mentions a window should hold, a single bucket is never split
+    """
+    cuts = []
+    total = 0
+    for bucket_start, mentions in counts:
+        if total and total + mentions > target_mentions:
+            cuts.append(bucket_start)
+            total = 0
+        total += mentions
+    return _windows_from_cuts(start_time, end_time, cuts)
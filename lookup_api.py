@@ -1,5 +1,4 @@
-import json
-
+from spr_api.json_codec import get_codec
 from spr_api.spr_app import SprApp
 from spr_api.endpoints import LOOKUP_ENDPOINT
 
@@ -18,8 +17,14 @@ class LookupRequest():
     def add_keys(self, keys):
         self.keys.extend(keys)
 
-    def toJson(self):
-        return json.dumps(self, default=lambda o: o.__dict__)
+    def toJson(self, codec=None):
+        return self.toJsonBytes(codec).decode("utf-8")
+
+    def toJsonBytes(self, codec=None):
+        """
+        Returns the request body, encoded with codec (see spr_api.json_codec).
+        """
+        return get_codec(codec).dumps(self.__dict__)
 
 
 class LookupApi:
@@ -39,4 +44,29 @@ class LookupApi:
         headers = {
             "Content-Type": "application/json"
         }
-        return self.app.request("POST", LOOKUP_ENDPOINT, headers=headers, data=lookup_request.toJson(), params={})
+        return self.app.request("POST", LOOKUP_ENDPOINT, headers=headers,
+                                data=lookup_request.toJsonBytes(self.app.codec), params={})
+
+
+class AsyncLookupApi:
+
+    def __init__(self, app):
+        """
+        app : an instance of AsyncSprApp
+        """
+        self.app = app
+        if app is None:
+            raise TypeError("app can't be None")
+
+    async def lookup(self, lookup_request: LookupRequest):
+        """
+
+        Returns
+        -------
+        dict - consisting response for each key in lookup request
+        """
+        headers = {
+            "Content-Type": "application/json"
+        }
+        return await self.app.request("POST", LOOKUP_ENDPOINT, headers=headers,
+                                      data=lookup_request.toJsonBytes(self.app.codec), params={})
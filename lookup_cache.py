@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+from spr_api.lookup_api import LookupRequest
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_SIZE = 10000
+
+
+class LookupCache:
+    """
+    Thread safe name -> id cache for lookup calls, keyed by (env, key, lookup type, name). Entries expire after
+    ttl seconds and the least recently used entries are evicted once max_size is reached.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(app, lookup_type, name):
+        return app.spr_auth.env, app.spr_auth.key, lookup_type, name
+
+    def get(self, app, lookup_type, names):
+        """
+        Returns (dict of cached name -> id, list of names missing in the cache).
+        """
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for name in names:
+                cache_key = self._cache_key(app, lookup_type, name)
+                entry = self._entries.get(cache_key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(cache_key)
+                    found[name] = entry[0]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._entries[cache_key]
+                    missing.append(name)
+                    self.misses += 1
+        return found, missing
+
+    def put(self, app, lookup_type, ids_by_name):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for name, id in ids_by_name.items():
+                cache_key = self._cache_key(app, lookup_type, name)
+                self._entries[cache_key] = (id, expires_at)
+                self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def resolve(self, lookup_api, lookup_type, names):
+        """
+        Returns dict of name -> id for names, only names missing in the cache are looked up. Names which could
+        not be resolved are left out of the returned dict.
+        """
+        found, missing = self.get(lookup_api.app, lookup_type, names)
+        if missing:
+            lookup_request = LookupRequest()
+            lookup_request.type(lookup_type)
+            lookup_request.add_keys(list(dict.fromkeys(missing)))
+            response_dict = lookup_api.lookup(lookup_request) or {}
+            self.put(lookup_api.app, lookup_type, response_dict)
+            found.update((name, response_dict[name]) for name in missing if name in response_dict)
+        return found
+
+    def prefetch(self, lookup_api, lookup_type, names):
+        """
+        Resolves names in bulk ahead of building queries, returns the names which could not be resolved.
+        """
+        found = self.resolve(lookup_api, lookup_type, names)
+        return [name for name in names if name not in found]
+
+    def invalidate(self, env=None, key=None, lookup_type=None, name=None):
+        """
+        Removes the entries matching all of the given parts of the cache key, invalidates everything by default.
+        """
+        pattern = (env, key, lookup_type, name)
+        with self._lock:
+            for cache_key in list(self._entries):
+                if all(part is None or part == value for part, value in zip(pattern, cache_key)):
+                    del self._entries[cache_key]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+LOOKUP_CACHE = LookupCache()
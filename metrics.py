@@ -0,0 +1,280 @@
+"""
+In-memory aggregation of the calls made by SprApp, and exporters for it.
+
+    metrics = MetricsAggregator()
+    metrics.attach(app)
+    ...
+    print(metrics.render_prometheus())
+    serve_prometheus(metrics, port=9464)
+"""
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from spr_api.instrumentation import POST_RESPONSE, ON_REFRESH
+
+try:
+    from opentelemetry import metrics as otel_metrics
+except ImportError:
+    otel_metrics = None
+
+logger = logging.getLogger("metrics")
+
+# upper bounds in seconds of the latency buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PHASES = ("wait", "download", "decode", "refresh", "throttle")
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets, counts[i] is the no of observations <= buckets[i], the last count is
+    for the observations above every bucket.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction):
+        """
+        Returns the upper bound of the bucket holding the fraction quantile, None without observations or when it
+        is above the last bucket.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def cumulative(self):
+        counts = []
+        seen = 0
+        for count in self.counts[:-1]:
+            seen += count
+            counts.append(seen)
+        return counts
+
+
+class MetricsAggregator:
+    """
+    Keeps per (endpoint, method) latency histograms, time spent per phase, call counts per status, bytes, retries
+    and token refreshes of the apps it is attached to. Thread safe.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.latency = {}
+        self.phase_seconds = {}
+        self.calls = {}
+        self.errors = {}
+        self.bytes_sent = {}
+        self.bytes_received = {}
+        self.retries = {}
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.refresh_latency = Histogram(self.buckets)
+
+    def attach(self, app):
+        """
+        Registers the hooks of this aggregator on a SprApp.
+        """
+        app.add_hook(POST_RESPONSE, self.record)
+        app.add_hook(ON_REFRESH, self.record_refresh)
+        return self
+
+    def detach(self, app):
+        app.remove_hook(POST_RESPONSE, self.record)
+        app.remove_hook(ON_REFRESH, self.record_refresh)
+
+    def record(self, info):
+        """
+        Records a completed call, the post_response hook.
+        """
+        endpoint = (info.endpoint, info.method)
+        with self._lock:
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(self.buckets)
+            self.latency[endpoint].observe(info.timings["total"])
+            for phase in PHASES:
+                self.phase_seconds[endpoint + (phase,)] = self.phase_seconds.get(endpoint + (phase,), 0.0) + \
+                                                          info.timings[phase]
+            status = endpoint + (str(info.status),)
+            self.calls[status] = self.calls.get(status, 0) + 1
+            if info.error is not None:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            self.bytes_sent[endpoint] = self.bytes_sent.get(endpoint, 0) + info.bytes_sent
+            self.bytes_received[endpoint] = self.bytes_received.get(endpoint, 0) + info.bytes_received
+            self.retries[endpoint] = self.retries.get(endpoint, 0) + info.retries
+
+    def record_refresh(self, info):
+        """
+        Records a token refresh, the on_refresh hook.
+        """
+        with self._lock:
+            self.refreshes += 1
+            self.refresh_errors += info.error is not None
+            self.refresh_latency.observe(info.timings["refresh"])
+
+    def snapshot(self):
+        """
+        Returns the metrics per "METHOD endpoint" as a dict: calls, calls per status, errors, retries, bytes, p50,
+        p90 and p99 latency bucket bounds, and seconds spent per phase.
+        """
+        with self._lock:
+            endpoints = {}
+            for (endpoint, method), histogram in self.latency.items():
+                key = (endpoint, method)
+                endpoints["{} {}".format(method, endpoint)] = {
+                    "calls": histogram.count,
+                    "status": {status: count for (e, m, status), count in self.calls.items() if (e, m) == key},
+                    "errors": self.errors.get(key, 0),
+                    "retries": self.retries.get(key, 0),
+                    "bytes_sent": self.bytes_sent.get(key, 0),
+                    "bytes_received": self.bytes_received.get(key, 0),
+                    "seconds": histogram.sum,
+                    "p50": histogram.quantile(0.5),
+                    "p90": histogram.quantile(0.9),
+                    "p99": histogram.quantile(0.99),
+                    "phase_seconds": {phase: self.phase_seconds.get(key + (phase,), 0.0) for phase in PHASES},
+                }
+            return {"endpoints": endpoints, "refreshes": self.refreshes, "refresh_errors": self.refresh_errors,
+                    "refresh_seconds": self.refresh_latency.sum}
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def render_prometheus(self, prefix="spr_api"):
+        """
+        Returns the metrics in the prometheus text exposition format.
+        """
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+
+        def sample(name, labels, value):
+            label_text = ",".join('{}="{}"'.format(label, _escape(label_value)) for label, label_value in labels)
+            lines.append("{}_{}{{{}}} {}".format(prefix, name, label_text, value))
+
+        with self._lock:
+            metric("request_duration_seconds", "histogram", "Duration of api calls, retries included.")
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                labels = [("endpoint", endpoint), ("method", method)]
+                for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                    sample("request_duration_seconds_bucket", labels + [("le", repr(bound))], count)
+                sample("request_duration_seconds_bucket", labels + [("le", "+Inf")], histogram.count)
+                sample("request_duration_seconds_sum", labels, histogram.sum)
+                sample("request_duration_seconds_count", labels, histogram.count)
+
+            metric("request_phase_seconds_total", "counter", "Time spent per phase of api calls.")
+            for (endpoint, method, phase), seconds in sorted(self.phase_seconds.items()):
+                sample("request_phase_seconds_total", [("endpoint", endpoint), ("method", method), ("phase", phase)],
+                       seconds)
+
+            metric("requests_total", "counter", "Api calls per response status.")
+            for (endpoint, method, status), count in sorted(self.calls.items()):
+                sample("requests_total", [("endpoint", endpoint), ("method", method), ("status", status)], count)
+
+            for name, values, help_text in (("request_errors_total", self.errors, "Api calls which raised."),
+                                            ("request_retries_total", self.retries, "Retried api call attempts."),
+                                            ("request_bytes_sent_total", self.bytes_sent, "Request body bytes."),
+                                            ("response_bytes_received_total", self.bytes_received,
+                                             "Response body bytes.")):
+                metric(name, "counter", help_text)
+                for (endpoint, method), value in sorted(values.items()):
+                    sample(name, [("endpoint", endpoint), ("method", method)], value)
+
+            metric("token_refreshes_total", "counter", "Access token refreshes.")
+            lines.append("{}_token_refreshes_total {}".format(prefix, self.refreshes))
+            metric("token_refresh_errors_total", "counter", "Failed access token refreshes.")
+            lines.append("{}_token_refresh_errors_total {}".format(prefix, self.refresh_errors))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def serve_prometheus(aggregator, port=9464, host="0.0.0.0", prefix="spr_api"):
+    """
+    Serves aggregator.render_prometheus() at /metrics on a daemon thread. Returns the server, stop it with
+    server.shutdown().
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = aggregator.render_prometheus(prefix).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="spr-metrics", daemon=True).start()
+    return server
+
+
+class OpenTelemetryExporter:
+    """
+    Records the calls of the apps it is attached to on OpenTelemetry instruments: request duration and phase
+    histograms, and request, retry, byte and refresh counters. Requires opentelemetry-api, the meter provider
+    (and so the export destination) is configured by the application.
+    """
+
+    def __init__(self, meter=None, prefix="spr_api"):
+        if otel_metrics is None:
+            raise ImportError("OpenTelemetryExporter requires opentelemetry, "
+                              "install it with: pip install opentelemetry-api opentelemetry-sdk")
+        if meter is None:
+            meter = otel_metrics.get_meter("spr_api")
+        self.duration = meter.create_histogram(prefix + ".request.duration", unit="s",
+                                               description="Duration of api calls, retries included.")
+        self.phase = meter.create_histogram(prefix + ".request.phase.duration", unit="s",
+                                            description="Time spent per phase of api calls.")
+        self.requests = meter.create_counter(prefix + ".requests", description="Api calls.")
+        self.retries = meter.create_counter(prefix + ".request.retries", description="Retried api call attempts.")
+        self.bytes_received = meter.create_counter(prefix + ".response.bytes", unit="By",
+                                                   description="Response body bytes.")
+        self.refreshes = meter.create_counter(prefix + ".token.refreshes", description="Access token refreshes.")
+
+    def attach(self, app):
+        app.add_hook(POST_RESPONSE, self.record)
+        app.add_hook(ON_REFRESH, self.record_refresh)
+        return self
+
+    def record(self, info):
+        attributes = {"endpoint": info.endpoint, "method": info.method, "status": str(info.status),
+                      "error": info.error is not None}
+        self.duration.record(info.timings["total"], attributes)
+        for phase in PHASES:
+            self.phase.record(info.timings[phase], dict(attributes, phase=phase))
+        self.requests.add(1, attributes)
+        if info.retries:
+            self.retries.add(info.retries, attributes)
+        self.bytes_received.add(info.bytes_received, attributes)
+
+    def record_refresh(self, info):
+        self.refreshes.add(1, {"error": info.error is not None})
@@ -0,0 +1,199 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger("rate_limit")
+
+# sprinklr api keys are allowed 10 calls per second by default
+DEFAULT_RATE = 10.0
+# calls which may be sent back to back after an idle period, kept low so a burst does not trip the qps limit
+DEFAULT_BURST = 2
+DEFAULT_MAX_THROTTLE_RETRIES = 5
+# backoff of a throttled call without a Retry-After header, doubled on every retry
+THROTTLE_BACKOFF = 1.0
+MAX_THROTTLE_WAIT = 300
+# the rate is stretched once less than this fraction of a quota is left
+QUOTA_LOW_WATERMARK = 0.1
+# fraction of the qps allotted by the api the bucket is paced at
+QPS_HEADROOM = 0.9
+
+THROTTLED_ERROR_CODES = ("ERR_403_DEVELOPER_OVER_QPS", "ERR_403_DEVELOPER_OVER_RATE")
+
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _seconds_until(value, now=None):
+    """
+    Returns the seconds until a reset/Retry-After header value: a delay in seconds, an epoch timestamp, an http
+    date or the mashery reset date ("Thursday, September 9, 2021 12:00:00 AM GMT"). None if it can't be parsed.
+    """
+    if value is None:
+        return None
+    now = time.time() if now is None else now
+    number = _number(value)
+    if number is not None:
+        # large values are epoch timestamps, small ones delays
+        return max(number - now, 0.0) if number > 10 ** 9 else max(number, 0.0)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        try:
+            moment = datetime.strptime(value, "%A, %B %d, %Y %I:%M:%S %p GMT").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(moment.timestamp() - now, 0.0)
+
+
+def retry_after(headers):
+    """
+    Returns the seconds a throttled response asks to wait, None without a Retry-After header.
+    """
+    return _seconds_until(headers.get("Retry-After"))
+
+
+def is_throttled(status_code, headers):
+    """
+    Returns True for responses rejected by the rate limits: 429, and the 403 of mashery quota errors.
+    """
+    if status_code == 429:
+        return True
+    if status_code == 403:
+        code = headers.get("X-Mashery-Error-Code") or ""
+        return code in THROTTLED_ERROR_CODES or "Retry-After" in headers
+    return False
+
+
+def throttle_delay(headers, attempt):
+    """
+    Returns the seconds to wait before sending a throttled call again: Retry-After, or an exponential backoff,
+    plus a random jitter so the callers which were throttled together do not retry together.
+    """
+    delay = retry_after(headers)
+    if delay is None:
+        delay = THROTTLE_BACKOFF * (2 ** attempt)
+        return min(random.uniform(delay / 2, delay), MAX_THROTTLE_WAIT)
+    return min(delay + random.uniform(0, min(delay, 1.0) / 2 + 0.05), MAX_THROTTLE_WAIT)
+
+
+class RateLimiter:
+    """
+    Token bucket pacing the calls of one api key, shared by all threads (and event loops) using it. Every call
+    reserves a token; when none is left the caller waits for its turn, so calls are spread at the rate instead of
+    sent in bursts. The rate follows the limits reported in the response headers.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        """
+        Parameters
+        ----------
+        rate : max calls per second
+        burst : max calls sent back to back after the bucket filled up while idle
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        # time the token count was last updated at, in the future while paused
+        self._updated = time.monotonic()
+
+    def reserve(self):
+        """
+        Takes a token and returns the seconds the caller has to wait before sending its call.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.burst)
+                self._updated = now
+            # a negative count is the queue of callers already waiting for a token
+            self._tokens -= 1
+            wait = self._updated - now
+            if self._tokens < 0:
+                wait += -self._tokens / self.rate
+            return wait
+
+    def acquire(self):
+        """
+        Blocks until the caller may send a call, returns the seconds waited.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """
+        Holds every call of the key for seconds, after a throttled response.
+        """
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._updated:
+                # no tokens accumulate while paused, calls resume at the rate instead of in a burst
+                self._updated = until
+                self._tokens = min(self._tokens, 0.0)
+
+    def observe(self, headers):
+        """
+        Adjusts the rate from the rate limit headers of a response: the mashery X-Plan-QPS/X-Plan-Quota headers and
+        the X-RateLimit-* headers. The rate is capped to the allotted qps, and stretched so the remaining quota
+        lasts until its reset once it runs low.
+        """
+        rate = self.max_rate
+        qps = _number(_header(headers, "X-Plan-QPS-Allotted"))
+        if qps:
+            rate = min(rate, qps * QPS_HEADROOM)
+
+        limit = _number(_header(headers, "X-Plan-Quota-Allotted", "X-RateLimit-Limit"))
+        remaining = _number(_header(headers, "X-RateLimit-Remaining"))
+        if remaining is None and limit is not None:
+            current = _number(_header(headers, "X-Plan-Quota-Current"))
+            remaining = limit - current if current is not None else None
+        if limit and remaining is not None and remaining < limit * QUOTA_LOW_WATERMARK:
+            reset = _seconds_until(_header(headers, "X-Plan-Quota-Reset", "X-RateLimit-Reset"))
+            if reset:
+                rate = min(rate, max(remaining, 1) / reset)
+
+        if rate != self.rate:
+            with self._lock:
+                if rate < self.rate:
+                    logger.info("Pacing calls at {:.3f}/s from the rate limit headers".format(rate))
+                self.rate = rate
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter(env, key, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+    """
+    Returns the RateLimiter of an env/key, shared by every app of the process using it. The rate and burst of the
+    first call are kept, a later call asking for others gets the existing limiter and a warning; pass a
+    RateLimiter to the app to pace it separately.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get((env, key))
+        if limiter is None:
+            limiter = _limiters[(env, key)] = RateLimiter(rate, burst)
+        elif (rate, burst) != (limiter.max_rate, limiter.burst):
+            logger.warning("The rate limiter of {}/{} paces calls at {}/s with a burst of {}, ignoring rate {} and "
+                           "burst {}".format(env, key, limiter.max_rate, limiter.burst, rate, burst))
+        return limiter
@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+DEFAULT_CHECKPOINT_DIR = Path.home() / ".sprinklr" / "checkpoints"
+
+
+def write_bytes(path, data):
+    """
+    Replaces the file at path atomically, readers see either the old or the new content.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_json(path, data):
+    """
+    Replaces the json file at path atomically, see write_bytes.
+    """
+    write_bytes(path, json.dumps(data).encode("utf-8"))
+
+
+class Checkpoint:
+    """
+    Progress of one paged or streamed export, kept in <directory>/<fingerprint>.json so an export restarted with
+    the same report payload resumes where it stopped. The file is replaced atomically on every save and removed
+    once the export completed.
+    """
+
+    def __init__(self, fingerprint, directory=DEFAULT_CHECKPOINT_DIR):
+        """
+        Parameters
+        ----------
+        fingerprint : identity of the report, see spr_api.reporting.Fingerprint.payload_fingerprint
+        directory : directory the checkpoint files are kept in, created when missing
+        """
+        self.fingerprint = fingerprint
+        self.directory = Path(directory)
+        self.path = self.directory / "{}.json".format(fingerprint)
+
+    def load(self):
+        """
+        Returns the saved state ({"page", "page_size", "rows_emitted", "headings", "cursor"}), None when there is
+        none.
+        """
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        return state
+
+    def save(self, page, rows_emitted, headings=None, cursor=None, page_size=None):
+        """
+        Records that every page before page (of page_size rows) was consumed, rows_emitted rows in total. cursor is
+        the stream cursor of the next page of a STREAM report (see StreamPages), None for reports paged by index.
+        """
+        write_json(self.path, {"fingerprint": self.fingerprint, "page": page, "page_size": page_size,
+                               "rows_emitted": rows_emitted, "headings": headings, "cursor": cursor})
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,153 @@
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TIME = "time"
+DIMENSION = "dimension"
+MEASURE = "measure"
+
+# missing epoch millis, the same bit pattern numpy and arrow use for NaT
+MISSING_TIME = -2 ** 63
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Columnar exports require numpy, install it with: pip install numpy")
+
+
+class TimeColumn:
+    """
+    Epoch millis stored as int64.
+    """
+    kind = TIME
+
+    def __init__(self):
+        self.values = array('q')
+
+    def append(self, value):
+        self.values.append(MISSING_TIME if value is None else int(value))
+
+    def to_numpy(self):
+        _require_numpy()
+        return np.frombuffer(self.values, dtype='datetime64[ms]')
+
+
+class DimensionColumn:
+    """
+    Dictionary encoded values: int32 codes into categories, -1 for missing values.
+    """
+    kind = DIMENSION
+
+    def __init__(self):
+        self.codes = array('i')
+        self.categories = []
+        self._index = {}
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+        if isinstance(value, list):
+            value = tuple(value)
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def to_numpy(self):
+        _require_numpy()
+        return np.frombuffer(self.codes, dtype=np.int32)
+
+
+class MeasureColumn:
+    """
+    Projection values stored as int64, switched to float64 once a fractional or missing value is seen.
+    """
+    kind = MEASURE
+
+    def __init__(self):
+        self.values = array('q')
+
+    def append(self, value):
+        if self.values.typecode == 'q' and (value is None or isinstance(value, float)):
+            self.values = array('d', self.values)
+        if self.values.typecode == 'd':
+            self.values.append(math.nan if value is None else float(value))
+        else:
+            self.values.append(int(value))
+
+    def to_numpy(self):
+        _require_numpy()
+        return np.frombuffer(self.values, dtype=np.int64 if self.values.typecode == 'q' else np.float64)
+
+
+COLUMN_TYPES = {TIME: TimeColumn, DIMENSION: DimensionColumn, MEASURE: MeasureColumn}
+
+
+class ColumnarResult:
+    """
+    Report rows decoded page by page into typed column buffers instead of lists of python rows. The buffers are
+    exported to numpy, pandas and arrow without copying the numeric data.
+    """
+
+    def __init__(self, headings, kinds):
+        """
+        Parameters
+        ----------
+        headings : column headings, in row order
+        kinds : one of TIME, DIMENSION or MEASURE for every column
+        """
+        if len(headings) != len(kinds):
+            raise ValueError("Expected one column kind per heading")
+        self.headings = list(headings)
+        self.columns = [COLUMN_TYPES[kind]() for kind in kinds]
+        self.num_rows = 0
+
+    def append_rows(self, rows):
+        appends = [column.append for column in self.columns]
+        for row in rows:
+            for append, value in zip(appends, row):
+                append(value)
+        self.num_rows += len(rows)
+
+    def __len__(self):
+        return self.num_rows
+
+    def column(self, heading):
+        return self.columns[self.headings.index(heading)]
+
+    def to_numpy(self):
+        """
+        Returns dict of heading -> numpy array, dimensions are returned as their int32 codes.
+        """
+        return {heading: column.to_numpy() for heading, column in zip(self.headings, self.columns)}
+
+    def to_pandas(self):
+        import pandas as pd
+        data = {}
+        for heading, column in zip(self.headings, self.columns):
+            if column.kind == DIMENSION:
+                data[heading] = pd.Categorical.from_codes(column.to_numpy(), categories=column.categories)
+            else:
+                data[heading] = column.to_numpy()
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self):
+        import pyarrow as pa
+        arrays = []
+        for column in self.columns:
+            values = column.to_numpy()
+            if column.kind == TIME:
+                arrays.append(pa.array(values.view(np.int64), type=pa.timestamp('ms', tz='UTC'),
+                                       mask=values.view(np.int64) == MISSING_TIME))
+            elif column.kind == DIMENSION:
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(values, mask=values < 0),
+                                                             pa.array(column.categories)))
+            else:
+                arrays.append(pa.array(values))
+        return pa.Table.from_arrays(arrays, names=self.headings)
@@ -0,0 +1,103 @@
+import hashlib
+import json
+
+from spr_api.json_codec import get_codec
+
+# payload members which are not serialised with the clauses, so a query can be moved in time or re-paged cheaply
+RANGE_MEMBERS = ("startTime", "endTime", "pageSize", "page")
+
+
+class CompiledQuery:
+    """
+    Immutable, hashable reports/query payload: the serialised payload bytes and their fingerprint. The clauses
+    (engine, report, filters, groups, projections, sorts, additional...) are serialised once and shared by every
+    query derived with with_time_range or with_page_size, only the time range and paging are serialised again.
+
+    Attributes
+    ----------
+    start_time, end_time : time range in epoch millis
+    page_size : no of rows per page
+    payload_bytes : the json payload of the first page
+    fingerprint : hex digest identifying the payload, equal for queries with the same clauses, range and page size
+    shape : hex digest of the clauses alone, equal for queries differing only in time range and paging, same as
+            spr_api.reporting.PageSize.query_shape of the payload
+    """
+
+    __slots__ = ("start_time", "end_time", "page_size", "payload_bytes", "fingerprint", "_clauses", "_codec")
+
+    def __init__(self, clauses, start_time, end_time, page_size, codec=None):
+        """
+        Parameters
+        ----------
+        clauses : the payload, its time range and paging members (see RANGE_MEMBERS) are ignored
+        start_time, end_time : time range in epoch millis
+        page_size : no of rows per page
+        codec : json codec the payload is serialised with, see spr_api.json_codec
+        """
+        codec = get_codec(codec)
+        if isinstance(clauses, dict):
+            clauses = _Clauses(clauses, codec)
+        setattr_ = object.__setattr__
+        setattr_(self, "_clauses", clauses)
+        setattr_(self, "_codec", codec)
+        setattr_(self, "start_time", start_time)
+        setattr_(self, "end_time", end_time)
+        setattr_(self, "page_size", page_size)
+        setattr_(self, "payload_bytes", self.page_bytes(0))
+        range_key = "|{}|{}|{}".format(start_time, end_time, page_size).encode("ascii")
+        setattr_(self, "fingerprint", hashlib.sha256(clauses.canonical + range_key).hexdigest())
+
+    @property
+    def shape(self):
+        return self._clauses.shape
+
+    def page_bytes(self, page, page_size=None):
+        """
+        Returns the json payload of page, at page_size rows per page (defaults to self.page_size).
+        """
+        return self._clauses.head + b'"startTime":%d,"endTime":%d,"pageSize":%d,"page":%d}' % (
+            self.start_time, self.end_time, self.page_size if page_size is None else page_size, page)
+
+    def payload(self):
+        """
+        Returns the payload as a new dict, page 0.
+        """
+        return self._codec.loads(self.payload_bytes)
+
+    def with_time_range(self, start_time, end_time):
+        return CompiledQuery(self._clauses, start_time, end_time, self.page_size, self._codec)
+
+    def with_page_size(self, page_size):
+        return CompiledQuery(self._clauses, self.start_time, self.end_time, page_size, self._codec)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledQuery is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CompiledQuery is immutable")
+
+    def __eq__(self, other):
+        return isinstance(other, CompiledQuery) and self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def __repr__(self):
+        return "CompiledQuery({}..., {}-{}, pageSize={})".format(self.fingerprint[:12], self.start_time,
+                                                                 self.end_time, self.page_size)
+
+
+class _Clauses:
+    """
+    Serialised clauses of a payload: head is the json object up to the range members, canonical the sorted key
+    encoding the fingerprints are computed from.
+    """
+
+    __slots__ = ("head", "canonical", "shape")
+
+    def __init__(self, clauses, codec):
+        clauses = {key: value for key, value in clauses.items() if key not in RANGE_MEMBERS}
+        encoded = codec.dumps(clauses)
+        self.head = encoded[:-1] + (b"," if clauses else b"")
+        self.canonical = json.dumps(clauses, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+        self.shape = hashlib.sha256(self.canonical).hexdigest()
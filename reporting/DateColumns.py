@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# strftime formats numpy renders natively: format -> (datetime64 unit, separator replacing the "T")
+NUMPY_FORMATS = {
+    "%Y-%m-%d": ("D", None),
+    "%Y-%m-%d %H:%M": ("m", " "),
+    "%Y-%m-%dT%H:%M": ("m", None),
+    "%Y-%m-%d %H:%M:%S": ("s", " "),
+    "%Y-%m-%dT%H:%M:%S": ("s", None),
+}
+
+MAX_MEMO_SIZE = 100000
+
+# (format, epoch millis) -> formatted value, shared across pages since time buckets repeat on every page
+_memo = {}
+
+
+def _format_values(values, date_format):
+    """
+    Returns the formatted strings of a list of epoch millis, converted in one vectorised call when numpy is
+    installed.
+    """
+    if np is None:
+        return [datetime.fromtimestamp(value / 1000, timezone.utc).strftime(date_format) for value in values]
+    dates = np.array(values, dtype=np.int64).astype("datetime64[ms]")
+    if date_format in NUMPY_FORMATS:
+        unit, separator = NUMPY_FORMATS[date_format]
+        strings = np.datetime_as_string(dates, unit=unit)
+        if separator is not None:
+            strings = np.char.replace(strings, "T", separator)
+        return strings.tolist()
+    return [date.strftime(date_format) for date in dates.astype(object)]
+
+
+def format_date_columns(rows, date_format_columns):
+    """
+    Converts the epoch millis of the date columns of rows, in place, using the (column index, format) pairs.
+    The whole batch of rows is converted at once, every distinct value is formatted only once and columns whose
+    format is None are left as epoch millis.
+    """
+    for column, date_format in date_format_columns:
+        if date_format is None:
+            continue
+        values = [row[column] for row in rows]
+        formatted = {}
+        missing = []
+        for value in set(values):
+            if value is not None:
+                cached = _memo.get((date_format, value))
+                if cached is None:
+                    missing.append(value)
+                else:
+                    formatted[value] = cached
+        if missing:
+            converted = dict(zip(missing, _format_values(missing, date_format)))
+            formatted.update(converted)
+            if len(_memo) + len(converted) > MAX_MEMO_SIZE:
+                _memo.clear()
+            _memo.update(((date_format, value), string) for value, string in converted.items())
+        for row, value in zip(rows, values):
+            if value is not None:
+                row[column] = formatted[value]
+    return rows
@@ -0,0 +1,32 @@
+import hashlib
+import json
+
+# payload members which change between the calls of one report and are not part of its identity
+VOLATILE_MEMBERS = ("page",)
+
+
+def payload_fingerprint(payload, exclude=VOLATILE_MEMBERS):
+    """
+    Returns a stable hex digest of a reports/query payload, equal for payloads describing the same report
+    regardless of key order. Members in exclude are ignored.
+    """
+    canonical = {key: value for key, value in payload.items() if key not in exclude}
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def account_fingerprint(env, key):
+    """
+    Returns a hex digest identifying an env/key, so results kept on disk are scoped to the account they were
+    fetched with without writing the key itself.
+    """
+    return hashlib.sha256("{}/{}".format(env, key).encode("utf-8")).hexdigest()
+
+
+def scoped_fingerprint(scope, fingerprint):
+    """
+    Returns fingerprint scoped to scope (e.g. an account_fingerprint), fingerprint itself when scope is None.
+    """
+    if scope is None:
+        return fingerprint
+    return hashlib.sha256("{}|{}".format(scope, fingerprint).encode("utf-8")).hexdigest()
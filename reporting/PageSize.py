@@ -0,0 +1,198 @@
+import asyncio
+import json
+import threading
+from pathlib import Path
+
+import requests
+
+from spr_api.errors import SprApiError
+from spr_api.reporting.Checkpoint import write_json
+from spr_api.reporting.Fingerprint import payload_fingerprint
+
+DEFAULT_MIN_PAGE_SIZE = 10
+DEFAULT_MAX_PAGE_SIZE = 10000
+# a page is grown while doubling it is expected to stay under both targets
+DEFAULT_TARGET_LATENCY = 10.0
+DEFAULT_TARGET_BYTES = 8 * 1024 * 1024
+DEFAULT_HISTORY_FILE = Path.home() / ".sprinklr" / "page_sizes.json"
+# payload members which do not change the cost of a row
+SHAPE_EXCLUDED_MEMBERS = ("page", "pageSize", "startTime", "endTime")
+
+
+def query_shape(payload):
+    """
+    Returns the fingerprint of the shape of a reports/query payload: its groups, projections, filters and sorts,
+    without the time range and paging.
+    """
+    return payload_fingerprint(payload, exclude=SHAPE_EXCLUDED_MEMBERS)
+
+
+def is_overload(error):
+    """
+    Returns True for errors a smaller page may avoid: read timeouts and 5xx responses.
+    """
+    if isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # read timeouts retried by urllib3 surface as a ConnectionError wrapping MaxRetryError(ReadTimeoutError)
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return type(reason).__name__ == "ReadTimeoutError"
+    return isinstance(error, SprApiError) and error.status_code is not None and error.status_code >= 500
+
+
+class PageSizeHistory:
+    """
+    Best known page size per query shape, kept in a json file so later runs of the same report start from it.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_FILE):
+        """
+        Parameters
+        ----------
+        path : json file of the sizes, None to only keep them in memory
+        """
+        self.path = Path(path) if path is not None else None
+        self._lock = threading.Lock()
+        self._sizes = None
+
+    def _load(self):
+        if self._sizes is None:
+            self._sizes = {}
+            if self.path is not None:
+                try:
+                    with open(self.path) as f:
+                        self._sizes = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    pass
+        return self._sizes
+
+    def get(self, shape):
+        with self._lock:
+            return self._load().get(shape)
+
+    def put(self, shape, page_size):
+        with self._lock:
+            sizes = self._load()
+            if sizes.get(shape) == page_size:
+                return
+            sizes[shape] = page_size
+            if self.path is not None:
+                write_json(self.path, sizes)
+
+
+class PageSizeTuner:
+    """
+    Adapts the page size of a paged report: doubles it while the latency and size of a page stay under half their
+    targets, halves it when a page goes over a target or fails with a timeout or 5xx. Sizes only change at row
+    offsets which are a multiple of the new size, so page index * page size keeps addressing the next row.
+    A tuner keeps the state of one pagination, use fresh() to get a tuner with the same settings for another one.
+    """
+
+    def __init__(self, seed=None, min_size=DEFAULT_MIN_PAGE_SIZE, max_size=DEFAULT_MAX_PAGE_SIZE,
+                 target_latency=DEFAULT_TARGET_LATENCY, target_bytes=DEFAULT_TARGET_BYTES, history=None):
+        """
+        Parameters
+        ----------
+        seed : first page size, defaults to the pageSize of the payload
+        min_size, max_size : bounds of the page size
+        target_latency : seconds a page call should stay under
+        target_bytes : response bytes a page should stay under
+        history : PageSizeHistory, the best known size of the query shape is used instead of seed and the final
+                  size is recorded in it
+        """
+        self.seed = seed
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.target_bytes = target_bytes
+        self.history = history
+        # smallest size which went over a target or failed, the size never grows back to it
+        self.ceiling = None
+        # largest size the server returned a full page at, a shorter page at a bigger size may have been cut at
+        # the max page size of the server instead of being the last one
+        self.served = 0
+
+    def fresh(self):
+        """
+        Returns a tuner with the same settings and history, without the state of the pagination of this one.
+        """
+        return PageSizeTuner(self.seed, self.min_size, self.max_size, self.target_latency, self.target_bytes,
+                             self.history)
+
+    def initial(self, payload):
+        """
+        Returns the page size to start with for payload.
+        """
+        known = self.history.get(query_shape(payload)) if self.history is not None else None
+        size = known or self.seed or payload["pageSize"]
+        # the page size of the query is trusted, as it is by the fetches without a tuner
+        self.served = max(self.served, payload["pageSize"])
+        return min(max(size, self.min_size), self.max_size)
+
+    def _resize(self, page, page_size, target, grow):
+        """
+        Returns (page, size) for the largest size up to target at which the row offset of page starts a page,
+        bigger than page_size when grow and smaller otherwise, None when there is none within the bounds.
+        """
+        offset = page * page_size
+        if grow:
+            if self.ceiling is not None:
+                target = min(target, self.ceiling - 1)
+            sizes = range(min(target, self.max_size), page_size, -1)
+        else:
+            sizes = range(min(target, page_size - 1), self.min_size - 1, -1)
+        for size in sizes:
+            if offset % size == 0:
+                return offset // size, size
+        return None
+
+    def next(self, page, page_size, elapsed, size_bytes):
+        """
+        Returns (page, page_size) of the next call after a page was fetched, page being the index of the next
+        page at page_size.
+        """
+        over = elapsed > self.target_latency or (size_bytes is not None and size_bytes > self.target_bytes)
+        under = elapsed * 2 <= self.target_latency and \
+            (size_bytes is None or size_bytes * 2 <= self.target_bytes)
+        resized = None
+        if over:
+            self._lower_ceiling(page_size)
+            resized = self._resize(page, page_size, page_size // 2, grow=False)
+        elif under:
+            resized = self._resize(page, page_size, page_size * 2, grow=True)
+        return resized or (page, page_size)
+
+    def full_page(self, page_size):
+        """
+        Records that a full page was returned at page_size.
+        """
+        self.served = max(self.served, page_size)
+
+    def recheck(self, page, page_size, rows):
+        """
+        Returns (page, page_size) to fetch a short page of rows rows again at a size the server served in full,
+        None when it is the last page. A short page is only ambiguous when it is bigger than any size the server
+        served in full: the server may have cut it at its max page size, which the size then never grows back to.
+        """
+        if page_size <= self.served or rows < self.served:
+            return None
+        self._lower_ceiling(page_size)
+        return self._resize(page, page_size, max(self.served, self.min_size), grow=False)
+
+    def shrink(self, page, page_size, error):
+        """
+        Returns (page, page_size) to retry a failed call with, None when the error is not one a smaller page
+        may avoid or the size is already at its minimum.
+        """
+        if not is_overload(error):
+            return None
+        self._lower_ceiling(page_size)
+        return self._resize(page, page_size, page_size // 2, grow=False)
+
+    def _lower_ceiling(self, page_size):
+        self.ceiling = page_size if self.ceiling is None else min(self.ceiling, page_size)
+
+    def record(self, payload, page_size):
+        if self.history is not None:
+            # a size the server did not serve in full is not known to be accepted
+            self.history.put(query_shape(payload), min(page_size, self.served) if self.served else page_size)
@@ -0,0 +1,358 @@
+import time
+
+from spr_api.endpoints import REPORTING_ENDPOINT
+from spr_api.reporting.Compiled import CompiledQuery
+from spr_api.reporting.DateColumns import format_date_columns
+from spr_api.reporting.Prefetch import prefetch, async_prefetch
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+# rows formatted per call of format_date_columns when rows are streamed one by one
+DEFAULT_ROW_BATCH_SIZE = 500
+
+
+class ReportPages:
+    """
+    Iterates the pages of a reports/query payload, one api call per page. Each item is the "data" of a page,
+    a dict with "headings" and "rows".
+    """
+
+    def __init__(self, app, payload, date_format_columns=(), request=None, start_page=0, checkpoint=None,
+                 prefetch_depth=0, tuner=None):
+        """
+        Parameters
+        ----------
+        app : an instance of SprApp
+        payload : reports/query payload, "page" is set for every call, or a CompiledQuery to send its serialised
+                  payload without encoding it again for every page
+        date_format_columns : (column index, format) pairs of epoch millis columns to be formatted
+        request : the listening request, returned back as is
+        start_page : index of the first page to be fetched
+        checkpoint : a spr_api.reporting.Checkpoint, the progress is saved to it once each page was consumed and
+                     iteration resumes from it, start_page is then ignored. Pages are delivered at least once, the
+                     page being consumed when the process stopped is fetched again.
+        prefetch_depth : no of pages fetched ahead on a background thread (a task for AsyncReportPages) while the
+                         caller processes the current one, see spr_api.reporting.Prefetch. 0 fetches each page
+                         when it is asked for. Checkpoints still only record the pages the caller consumed.
+        tuner : a spr_api.reporting.PageSize.PageSizeTuner adapting the page size from page to page, self.page
+                is then counted in pages of self.page_size
+        """
+        self.app = app
+        self.compiled = payload if isinstance(payload, CompiledQuery) else None
+        if self.compiled is not None:
+            payload = self.compiled.payload()
+        self.payload = payload
+        self.date_format_columns = date_format_columns
+        self.request = request
+        self.page = start_page
+        self.headings = None
+        self.rows_emitted = 0
+        self.checkpoint = checkpoint
+        self.resumed = False
+        self.prefetch_depth = prefetch_depth
+        self.tuner = tuner
+        self.page_size = payload["pageSize"]
+        if tuner is not None and start_page == 0:
+            self.page_size = tuner.initial(payload)
+        state = checkpoint.load() if checkpoint is not None else None
+        if state is not None:
+            self.page = state["page"]
+            self.page_size = state.get("page_size") or payload["pageSize"]
+            self.rows_emitted = state["rows_emitted"]
+            self.headings = state["headings"]
+            self.resumed = True
+
+    def _page_payload(self, page=None, page_size=None):
+        if self.compiled is not None:
+            return self.compiled.page_bytes(self.page if page is None else page,
+                                            self.page_size if page_size is None else page_size)
+        payload = dict(self.payload)
+        payload["page"] = self.page if page is None else page
+        payload["pageSize"] = self.page_size if page_size is None else page_size
+        return self.app.codec.dumps(payload)
+
+    def _process(self, data):
+        data = data or {}
+        format_date_columns(data.get("rows") or [], self.date_format_columns)
+        return data
+
+    def _is_last(self, data, page_size=None):
+        return len(data.get("rows") or []) < (self.page_size if page_size is None else page_size)
+
+    def _recheck(self, data, page, page_size, is_last):
+        """
+        Returns (page, page_size) to fetch a page again when it may have been cut by the server instead of being
+        the last one, see PageSizeTuner.recheck.
+        """
+        if not is_last:
+            self.tuner.full_page(page_size)
+            return None
+        return self.tuner.recheck(page, page_size, len(data.get("rows") or []))
+
+    def _page_consumed(self, count, is_last):
+        """
+        Called once the caller consumed every row of the page before self.page.
+        """
+        self.rows_emitted += count
+        if self.checkpoint is None:
+            return
+        if is_last:
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save(self.page, self.rows_emitted, self.headings, page_size=self.page_size)
+
+    def _fetch_pages(self):
+        """
+        Fetches the pages from self.page on, without touching the iteration state, so it can run ahead of the
+        caller on another thread. Yields (data, index of the next page, page size of data and the next page, is
+        last).
+        """
+        page, page_size = self.page, self.page_size
+        while True:
+            start = time.perf_counter()
+            try:
+                data = self._process(self.app.request("POST", REPORTING_ENDPOINT, headers=dict(JSON_HEADERS),
+                                                      data=self._page_payload(page, page_size)))
+            except Exception as e:
+                retry = self.tuner.shrink(page, page_size, e) if self.tuner is not None else None
+                if retry is None:
+                    raise
+                page, page_size = retry
+                continue
+            is_last = self._is_last(data, page_size)
+            if self.tuner is not None:
+                retry = self._recheck(data, page, page_size, is_last)
+                if retry is not None:
+                    page, page_size = retry
+                    continue
+            next_page, next_page_size = page + 1, page_size
+            if self.tuner is not None:
+                info = self.app.last_request_info() if hasattr(self.app, "last_request_info") else None
+                if is_last:
+                    self.tuner.record(self.payload, page_size)
+                else:
+                    next_page, next_page_size = self.tuner.next(next_page, page_size, time.perf_counter() - start,
+                                                                info.bytes_received if info is not None else None)
+            yield data, next_page, next_page_size, is_last
+            if is_last:
+                return
+            page, page_size = next_page, next_page_size
+
+    def _consume(self, pages):
+        for data, next_page, next_page_size, is_last in pages:
+            if self.headings is None:
+                self.headings = data.get("headings")
+            self.page, self.page_size = next_page, next_page_size
+            yield data
+            self._page_consumed(len(data.get("rows") or []), is_last)
+
+    def __iter__(self):
+        pages = self._fetch_pages()
+        if self.prefetch_depth:
+            pages = prefetch(pages, self.prefetch_depth)
+        return self._consume(pages)
+
+    def iter_rows(self, batch_size=DEFAULT_ROW_BATCH_SIZE):
+        """
+        Yields the rows of every page one by one, decoded incrementally while each response arrives (see
+        SprApp.stream), so the whole page is never held in memory. Date columns are formatted in batches of
+        batch_size rows. self.headings is set once the headings of the first page were parsed. Requires ijson.
+        """
+        while True:
+            count = 0
+            batch = []
+            with self.app.stream("POST", REPORTING_ENDPOINT, headers=dict(JSON_HEADERS),
+                                 data=self._page_payload()) as rows:
+                for row in rows:
+                    if self.headings is None:
+                        self.headings = rows.headings
+                    count += 1
+                    if not self.date_format_columns:
+                        yield row
+                        continue
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        yield from format_date_columns(batch, self.date_format_columns)
+                        batch = []
+                if self.headings is None:
+                    self.headings = rows.headings
+            yield from format_date_columns(batch, self.date_format_columns)
+            self.page += 1
+            self._page_consumed(count, count < self.page_size)
+            if count < self.page_size:
+                return
+
+
+class AsyncReportPages(ReportPages):
+    """
+    Async iterator over the pages of a reports/query payload, app is an instance of AsyncSprApp.
+    """
+
+    def __iter__(self):
+        raise TypeError("AsyncReportPages must be iterated with async for")
+
+    def iter_rows(self, batch_size=DEFAULT_ROW_BATCH_SIZE):
+        raise TypeError("Rows are only streamed by ReportPages")
+
+    async def _fetch_pages(self):
+        page, page_size = self.page, self.page_size
+        while True:
+            start = time.perf_counter()
+            try:
+                data = self._process(await self.app.request("POST", REPORTING_ENDPOINT, headers=dict(JSON_HEADERS),
+                                                            data=self._page_payload(page, page_size)))
+            except Exception as e:
+                retry = self.tuner.shrink(page, page_size, e) if self.tuner is not None else None
+                if retry is None:
+                    raise
+                page, page_size = retry
+                continue
+            is_last = self._is_last(data, page_size)
+            if self.tuner is not None:
+                retry = self._recheck(data, page, page_size, is_last)
+                if retry is not None:
+                    page, page_size = retry
+                    continue
+            next_page, next_page_size = page + 1, page_size
+            if self.tuner is not None:
+                if is_last:
+                    self.tuner.record(self.payload, page_size)
+                else:
+                    # response sizes are not tracked by AsyncSprApp, only the latency target applies
+                    next_page, next_page_size = self.tuner.next(next_page, page_size, time.perf_counter() - start,
+                                                                None)
+            yield data, next_page, next_page_size, is_last
+            if is_last:
+                return
+            page, page_size = next_page, next_page_size
+
+    async def _consume(self, pages):
+        async for data, next_page, next_page_size, is_last in pages:
+            if self.headings is None:
+                self.headings = data.get("headings")
+            self.page, self.page_size = next_page, next_page_size
+            yield data
+            self._page_consumed(len(data.get("rows") or []), is_last)
+
+    def __aiter__(self):
+        pages = self._fetch_pages()
+        if self.prefetch_depth:
+            pages = async_prefetch(pages, self.prefetch_depth)
+        return self._consume(pages)
+
+
+class StreamPages:
+    """
+    Iterates the pages of a STREAM reports/query payload by following its cursor: the data of every page but the
+    last one carries the "cursor" of the next page, which is sent back as "cursor" of the next payload. Each item
+    is the "data" of a page.
+    """
+
+    def __init__(self, app, payload, checkpoint=None, prefetch_depth=0):
+        """
+        Parameters
+        ----------
+        app : an instance of SprApp
+        payload : STREAM reports/query payload, or a CompiledQuery to send its serialised payload
+        checkpoint : a spr_api.reporting.Checkpoint, the cursor of the next page is saved to it once each page was
+                     consumed and iteration resumes from the saved cursor. Pages are delivered at least once, the
+                     page being consumed when the process stopped is fetched again.
+        prefetch_depth : no of pages fetched ahead while the caller processes the current one, see ReportPages
+        """
+        self.app = app
+        self.compiled = payload if isinstance(payload, CompiledQuery) else None
+        self.payload = self.compiled.payload() if self.compiled is not None else payload
+        self.page = 0
+        self.headings = None
+        self.rows_emitted = 0
+        self.cursor = None
+        self.checkpoint = checkpoint
+        self.resumed = False
+        self.prefetch_depth = prefetch_depth
+        state = checkpoint.load() if checkpoint is not None else None
+        if state is not None:
+            self.page = state["page"]
+            self.rows_emitted = state["rows_emitted"]
+            self.headings = state["headings"]
+            self.cursor = state["cursor"]
+            self.resumed = True
+
+    def _page_payload(self, cursor):
+        if self.compiled is None:
+            return self.app.codec.dumps(self.payload if cursor is None else dict(self.payload, cursor=cursor))
+        if cursor is None:
+            return self.compiled.payload_bytes
+        # the cursor is added to the serialised payload, the clauses are not encoded again
+        return self.compiled.payload_bytes[:-1] + b',"cursor":' + self.app.codec.dumps(cursor) + b'}'
+
+    def _page_consumed(self, count, cursor):
+        """
+        Called once the caller consumed every row of a page, cursor is the cursor of the next one.
+        """
+        self.page += 1
+        self.rows_emitted += count
+        self.cursor = cursor
+        if self.checkpoint is None:
+            return
+        if cursor is None:
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save(self.page, self.rows_emitted, self.headings, cursor)
+
+    def _fetch_pages(self):
+        """
+        Fetches the pages from self.cursor on, without touching the iteration state, so it can run ahead of the
+        caller on another thread. Yields (data, cursor of the next page), the cursor is None after the last page.
+        """
+        cursor = self.cursor
+        while True:
+            data = self.app.request("POST", REPORTING_ENDPOINT, headers=dict(JSON_HEADERS),
+                                    data=self._page_payload(cursor)) or {}
+            cursor = data.get("cursor")
+            yield data, cursor
+            if cursor is None:
+                return
+
+    def _consume(self, pages):
+        for data, cursor in pages:
+            if self.headings is None:
+                self.headings = data.get("headings")
+            yield data
+            self._page_consumed(len(data.get("rows") or []), cursor)
+
+    def __iter__(self):
+        pages = self._fetch_pages()
+        if self.prefetch_depth:
+            pages = prefetch(pages, self.prefetch_depth)
+        return self._consume(pages)
+
+
+class AsyncStreamPages(StreamPages):
+    """
+    Async iterator over the pages of a STREAM reports/query payload, app is an instance of AsyncSprApp.
+    """
+
+    def __iter__(self):
+        raise TypeError("AsyncStreamPages must be iterated with async for")
+
+    async def _fetch_pages(self):
+        cursor = self.cursor
+        while True:
+            data = await self.app.request("POST", REPORTING_ENDPOINT, headers=dict(JSON_HEADERS),
+                                          data=self._page_payload(cursor)) or {}
+            cursor = data.get("cursor")
+            yield data, cursor
+            if cursor is None:
+                return
+
+    async def _consume(self, pages):
+        async for data, cursor in pages:
+            if self.headings is None:
+                self.headings = data.get("headings")
+            yield data
+            self._page_consumed(len(data.get("rows") or []), cursor)
+
+    def __aiter__(self):
+        pages = self._fetch_pages()
+        if self.prefetch_depth:
+            pages = async_prefetch(pages, self.prefetch_depth)
+        return self._consume(pages)
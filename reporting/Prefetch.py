@@ -0,0 +1,93 @@
+import asyncio
+import queue
+import threading
+
+DEFAULT_PREFETCH_DEPTH = 2
+# seconds between checks of the stop flag while the producer waits for room in the buffer
+POLL_INTERVAL = 0.1
+
+_ITEM, _ERROR, _DONE = range(3)
+
+
+def prefetch(pages, depth=DEFAULT_PREFETCH_DEPTH):
+    """
+    Iterates pages (any iterable, e.g. a ReportingResponse) on a background thread, reading up to depth items
+    ahead of the caller, so the next page is fetched while the current one is processed. The buffer is bounded,
+    the thread waits while depth items are unconsumed. Errors are raised to the caller in order. When the caller
+    stops iterating, the thread stops after the call it is running.
+    """
+    if depth < 1:
+        raise ValueError("depth must be >= 1")
+    buffer = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = None
+        try:
+            iterator = iter(pages)
+            for page in iterator:
+                if not put((_ITEM, page)):
+                    return
+            put((_DONE, None))
+        except Exception as e:
+            put((_ERROR, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def consume():
+        producer = threading.Thread(target=produce, name="spr-prefetch", daemon=True)
+        producer.start()
+        try:
+            while True:
+                kind, value = buffer.get()
+                if kind == _DONE:
+                    return
+                if kind == _ERROR:
+                    raise value
+                yield value
+        finally:
+            stopped.set()
+
+    return consume()
+
+
+async def async_prefetch(pages, depth=DEFAULT_PREFETCH_DEPTH):
+    """
+    Async version of prefetch for async iterables (e.g. AsyncReportPages), reading ahead on a task of the running
+    event loop.
+    """
+    if depth < 1:
+        raise ValueError("depth must be >= 1")
+    buffer = asyncio.Queue(maxsize=depth)
+
+    async def produce():
+        try:
+            async for page in pages:
+                await buffer.put((_ITEM, page))
+            await buffer.put((_DONE, None))
+        except Exception as e:
+            await buffer.put((_ERROR, e))
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            kind, value = await buffer.get()
+            if kind == _DONE:
+                return
+            if kind == _ERROR:
+                raise value
+            yield value
+    finally:
+        producer.cancel()
+
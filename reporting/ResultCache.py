@@ -0,0 +1,261 @@
+import gzip
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from spr_api.json_codec import get_codec
+from spr_api.reporting.Compiled import CompiledQuery
+from spr_api.reporting.Checkpoint import write_bytes
+from spr_api.reporting.DateColumns import format_date_columns
+from spr_api.reporting.Fingerprint import payload_fingerprint, scoped_fingerprint
+
+DEFAULT_CACHE_DIR = Path.home() / ".sprinklr" / "cache"
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# ttl of reports whose time range ended before now - settle delay, and of the ones still receiving mentions
+DEFAULT_PAST_TTL = 24 * 60 * 60
+DEFAULT_LIVE_TTL = 2 * 60
+# seconds after which no more mentions are expected to be indexed for a time range
+DEFAULT_SETTLE_DELAY = 60 * 60
+CACHE_SUFFIX = ".json.gz"
+
+
+class ResultCache:
+    """
+    Pages of reports/query results keyed by the fingerprint of their payload (engine, report, filters, groups,
+    projections, sorts, time range and page size), so identical queries made within the ttl are answered without
+    calling the api. Entries are kept in memory (encoded, least recently used evicted past max_entries or
+    max_bytes) and in gzip files in directory (oldest used evicted past disk_max_bytes). Thread safe, and the disk
+    tier can be shared by processes. Results of different accounts are kept apart by the scope passed with the
+    payload, see spr_api.reporting.Fingerprint.account_fingerprint.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 disk_max_bytes=DEFAULT_DISK_MAX_BYTES, past_ttl=DEFAULT_PAST_TTL, live_ttl=DEFAULT_LIVE_TTL,
+                 settle_delay=DEFAULT_SETTLE_DELAY, codec=None):
+        """
+        Parameters
+        ----------
+        directory : directory of the disk tier, created when missing, None to only cache in memory
+        max_entries, max_bytes : bounds of the memory tier, in results and encoded bytes
+        disk_max_bytes : bound of the disk tier, in compressed bytes
+        past_ttl : seconds a result is kept when its time range ended more than settle_delay seconds ago
+        live_ttl : seconds a result is kept when its time range reaches into the last settle_delay seconds
+        settle_delay : seconds after which the mentions of a time range are not expected to change anymore
+        codec : json codec of the entries, see spr_api.json_codec
+        """
+        self.directory = Path(directory) if directory is not None else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.past_ttl = past_ttl
+        self.live_ttl = live_ttl
+        self.settle_delay = settle_delay
+        self.codec = get_codec(codec)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # fingerprint -> (expires at, encoded entry), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def key(payload, scope=None):
+        """
+        Returns the key of payload (a dict or a CompiledQuery) within scope.
+        """
+        fingerprint = payload.fingerprint if isinstance(payload, CompiledQuery) else payload_fingerprint(payload)
+        return scoped_fingerprint(scope, fingerprint)
+
+    def ttl(self, payload):
+        """
+        Returns the seconds the result of payload (a dict or a CompiledQuery) may be cached for.
+        """
+        end_time = payload.end_time if isinstance(payload, CompiledQuery) else payload["endTime"]
+        settled = (time.time() - self.settle_delay) * 1000
+        return self.past_ttl if end_time < settled else self.live_ttl
+
+    def get(self, payload, scope=None):
+        """
+        Returns the cached pages of payload (a dict or a CompiledQuery) within scope, None when they are missing or
+        expired. Every call returns new page objects, callers may modify them.
+        """
+        key = self.key(payload, scope)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._evict(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            return self.codec.loads(entry[1])["pages"]
+        encoded, decoded = self._read(key, now)
+        with self._lock:
+            if decoded is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, decoded["expires_at"], encoded)
+            return decoded["pages"]
+
+    def put(self, payload, pages, scope=None):
+        """
+        Caches the pages of payload within scope for ttl(payload) seconds.
+        """
+        key = self.key(payload, scope)
+        expires_at = time.time() + self.ttl(payload)
+        encoded = self.codec.dumps({"expires_at": expires_at, "pages": pages})
+        with self._lock:
+            self._remember(key, expires_at, encoded)
+        if self.directory is not None:
+            write_bytes(self._path(key), gzip.compress(encoded, compresslevel=6))
+            self._trim_disk()
+
+    def invalidate(self, payload, scope=None):
+        key = self.key(payload, scope)
+        with self._lock:
+            self._evict(key)
+        if self.directory is not None:
+            self._remove(self._path(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.directory is not None and self.directory.is_dir():
+            for path in self.directory.glob("*" + CACHE_SUFFIX):
+                self._remove(path)
+
+    def pages(self, payload, fetch, date_format_columns=(), request=None, scope=None):
+        """
+        Returns a CachedPages iterating the pages of payload within scope from the cache, or from fetch() when they
+        are not cached.
+        """
+        return CachedPages(self, payload, fetch, date_format_columns, request, scope)
+
+    def _remember(self, key, expires_at, encoded):
+        self._evict(key)
+        self._entries[key] = (expires_at, encoded)
+        self._bytes += len(encoded)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _path(self, key):
+        return self.directory / (key + CACHE_SUFFIX)
+
+    def _read(self, key, now):
+        """
+        Returns (encoded, decoded) entry of the disk tier, (None, None) when it is missing or expired.
+        """
+        if self.directory is None:
+            return None, None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                encoded = gzip.decompress(f.read())
+            decoded = self.codec.loads(encoded)
+        except (OSError, EOFError, ValueError):
+            # missing, or left truncated by a full disk
+            return None, None
+        if decoded["expires_at"] <= now:
+            self._remove(path)
+            return None, None
+        # the modification time orders the files for eviction, most recently used last
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return encoded, decoded
+
+    def _trim_disk(self):
+        files = []
+        for path in self.directory.glob("*" + CACHE_SUFFIX):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files, key=lambda item: item[0]):
+            if total <= self.disk_max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    """
+    Returns the ResultCache in DEFAULT_CACHE_DIR shared by every query of the process using with_cache(True).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
+
+
+class CachedPages:
+    """
+    Pages of a report read through a ResultCache. Fetched pages are cached once the last one was read, a partially
+    read or failed result is not. Date columns are formatted on the returned pages, the cache keeps the epoch
+    millis.
+
+    Attributes
+    ----------
+    payload, request : of the report, request is the listening request returned back as is
+    scope : the entries are kept under, see ResultCache
+    headings : of the report, set once the first page was read
+    from_cache : True when the pages were read from the cache, None before iterating
+    """
+
+    def __init__(self, cache, payload, fetch, date_format_columns=(), request=None, scope=None):
+        self.cache = cache
+        self.payload = payload
+        self.scope = scope
+        self.fetch = fetch
+        self.date_format_columns = date_format_columns
+        self.request = request
+        self.headings = None
+        self.from_cache = None
+
+    def __iter__(self):
+        cached = self.cache.get(self.payload, self.scope)
+        self.from_cache = cached is not None
+        if cached is not None:
+            for page in cached:
+                yield self._process(page)
+            return
+        fetched = []
+        for page in self.fetch():
+            fetched.append({**page, "rows": [list(row) for row in page.get("rows") or []]})
+            yield self._process(page)
+        self.cache.put(self.payload, fetched, self.scope)
+
+    def _process(self, page):
+        if self.headings is None:
+            self.headings = page.get("headings")
+        format_date_columns(page.get("rows") or [], self.date_format_columns)
+        return page
@@ -0,0 +1,78 @@
+import re
+import threading
+
+# row types are created once per distinct headings
+_row_types = {}
+_row_types_lock = threading.Lock()
+
+
+class Row(tuple):
+    """
+    Immutable report row backed by a tuple, without a per row dict. Values are read by index (row[0]), by heading
+    (row["Mentions"]) or by attribute, the heading in snake case (row.message_id for "Message Id", headings named
+    like a tuple method, e.g. "Count", are only read by heading). Row types are created per headings with
+    row_type.
+    """
+
+    __slots__ = ()
+    headings = ()
+    _indexes = {}
+    _attributes = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._indexes[key])
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._attributes[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def asdict(self):
+        return dict(zip(self.headings, self))
+
+    def __reduce__(self):
+        # row types are created at runtime, pickled rows are rebuilt from their headings
+        return _make_row, (self.headings, tuple(self))
+
+    def __repr__(self):
+        return "Row({})".format(", ".join("{}={!r}".format(heading, value)
+                                          for heading, value in zip(self.headings, self)))
+
+
+def _attribute_name(heading):
+    name = re.sub(r"\W+", "_", str(heading)).strip("_").lower()
+    return "_" + name if not name or name[0].isdigit() else name
+
+
+def row_type(headings):
+    """
+    Returns the Row subclass of a list of headings.
+    """
+    headings = tuple(headings)
+    with _row_types_lock:
+        if headings not in _row_types:
+            attributes = {}
+            for index, heading in enumerate(headings):
+                attributes.setdefault(_attribute_name(heading), index)
+            _row_types[headings] = type("Row", (Row,), {
+                "__slots__": (),
+                "headings": headings,
+                "_indexes": {heading: index for index, heading in reversed(list(enumerate(headings)))},
+                "_attributes": attributes,
+            })
+        return _row_types[headings]
+
+
+def _make_row(headings, values):
+    return row_type(headings)(values)
+
+
+def to_rows(headings, rows):
+    """
+    Returns the rows (lists of values) as Rows of the headings.
+    """
+    make = row_type(headings)
+    return [make(row) for row in rows]
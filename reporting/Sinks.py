@@ -0,0 +1,255 @@
+import bz2
+import csv
+import gzip
+import io
+import lzma
+import os
+
+from spr_api.json_codec import get_codec
+from spr_api.reporting.Columnar import TIME, DIMENSION, MEASURE
+
+# buffer of the export files, a page is usually written with a single write call
+WRITE_BUFFER_SIZE = 1024 * 1024
+COMPRESSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+
+def _infer_compression(path):
+    return COMPRESSIONS.get(os.path.splitext(str(path))[1].lower())
+
+
+def open_output(path, compression=None):
+    """
+    Opens path for binary writing with a large buffer, compressed with compression ("gzip", "bz2", "xz").
+    """
+    raw = open(path, 'wb', buffering=WRITE_BUFFER_SIZE)
+    if compression is None:
+        return raw
+    if compression == "gzip":
+        # GzipFile does not close a fileobj it was given
+        return _Closing(gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6), raw)
+    if compression == "bz2":
+        return _Closing(bz2.BZ2File(raw, mode='wb'), raw)
+    if compression == "xz":
+        return _Closing(lzma.LZMAFile(raw, mode='wb'), raw)
+    raw.close()
+    raise ValueError("Unknown compression: {}, expected one of gzip, bz2, xz".format(compression))
+
+
+class _Closing:
+    """
+    A compressed file which also closes the file it writes to.
+    """
+
+    def __init__(self, file, raw):
+        self.file = file
+        self.raw = raw
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+        self.raw.close()
+
+
+class Sink:
+    """
+    Receives the headings and then the rows of a report page by page, e.g. from
+    Query.write_all_with_time_groups. Sinks are context managers, close is called once all rows are written.
+    """
+
+    def write_headings(self, headings):
+        pass
+
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CallbackSink(Sink):
+    """
+    Hands every batch of rows to on_rows(rows), and the headings to on_headings(headings) when passed.
+    """
+
+    def __init__(self, on_rows, on_headings=None):
+        self.on_rows = on_rows
+        self.on_headings = on_headings
+
+    def write_headings(self, headings):
+        if self.on_headings is not None:
+            self.on_headings(headings)
+
+    def write_rows(self, rows):
+        self.on_rows(rows)
+
+
+class JsonLinesSink(Sink):
+    """
+    Writes every row as one json object keyed by the headings, one object per line.
+    """
+
+    def __init__(self, path, compression="infer", codec=None):
+        """
+        Parameters
+        ----------
+        path : file to write
+        compression : "gzip", "bz2", "xz", None, or "infer" to pick it from the suffix of path (.gz, .bz2, .xz)
+        codec : json codec of the rows, see spr_api.json_codec
+        """
+        self.path = path
+        self.file = open_output(path, _infer_compression(path) if compression == "infer" else compression)
+        self.codec = get_codec(codec)
+        self.headings = None
+
+    def write_headings(self, headings):
+        self.headings = headings
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        dumps = self.codec.dumps
+        if self.headings:
+            lines = [dumps(dict(zip(self.headings, row))) for row in rows]
+        else:
+            lines = [dumps(row) for row in rows]
+        # one write per page
+        self.file.write(b"\n".join(lines) + b"\n")
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink(Sink):
+    """
+    Writes the headings as header line and every row as one csv line.
+    """
+
+    def __init__(self, path, compression="infer", **csv_options):
+        """
+        Parameters
+        ----------
+        path : file to write
+        compression : see JsonLinesSink
+        csv_options : passed to csv.writer, e.g. delimiter
+        """
+        self.path = path
+        self.file = open_output(path, _infer_compression(path) if compression == "infer" else compression)
+        self.csv_options = csv_options
+
+    def _write(self, rows):
+        text = io.StringIO()
+        csv.writer(text, **self.csv_options).writerows(rows)
+        # one write per page
+        self.file.write(text.getvalue().encode("utf-8"))
+
+    def write_headings(self, headings):
+        self._write([headings])
+
+    def write_rows(self, rows):
+        if rows:
+            self._write(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink(Sink):
+    """
+    Writes the rows to a parquet file, one row group per page. Requires pyarrow.
+    """
+
+    def __init__(self, path, compression="snappy", kinds=None):
+        """
+        Parameters
+        ----------
+        path : file to write
+        compression : parquet codec of the columns ("snappy", "gzip", "zstd", "brotli", "lz4", "none")
+        kinds : Columnar kind (TIME, DIMENSION, MEASURE) of every column, columns are typed as: TIME - timestamp
+                (epoch millis) or string (formatted dates), DIMENSION - string, MEASURE - float64. Types are inferred
+                from the first page when not passed.
+        """
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.compression = compression
+        self.kinds = kinds
+        self.headings = None
+        self.schema = None
+        self.writer = None
+
+    def write_headings(self, headings):
+        self.headings = headings
+
+    def _column_type(self, index, values):
+        pa = self.pa
+        kind = self.kinds[index] if self.kinds is not None else None
+        first = next((value for value in values if value is not None), None)
+        if kind == TIME:
+            return pa.timestamp("ms", tz="UTC") if isinstance(first, int) else pa.string()
+        if kind == DIMENSION:
+            return pa.string()
+        if kind == MEASURE:
+            return pa.float64()
+        inferred = pa.array(values).type
+        return pa.string() if pa.types.is_null(inferred) else inferred
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        pa = self.pa
+        columns = [list(column) for column in zip(*rows)]
+        if self.schema is None:
+            names = self.headings or ["column_{}".format(index) for index in range(len(columns))]
+            self.schema = pa.schema([(name, self._column_type(index, values))
+                                     for index, (name, values) in enumerate(zip(names, columns))])
+            self.writer = self.pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+        arrays = []
+        for field, values in zip(self.schema, columns):
+            if pa.types.is_timestamp(field.type):
+                arrays.append(pa.array(values, type=pa.int64()).cast(field.type))
+            elif pa.types.is_string(field.type):
+                arrays.append(pa.array([value if value is None or isinstance(value, str) else str(value)
+                                        for value in values], type=pa.string()))
+            else:
+                arrays.append(pa.array(values).cast(field.type, safe=False))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is None and self.headings:
+            # no rows, the file still gets the columns
+            schema = self.pa.schema([(name, self.pa.string()) for name in self.headings])
+            self.writer = self.pq.ParquetWriter(self.path, schema, compression=self.compression)
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_sink(path, format=None, compression="infer", codec=None, **options):
+    """
+    Returns the sink writing path in format ("csv", "jsonl", "parquet"), inferred from the suffix of path (before
+    a compression suffix) when not passed. codec is the json codec of jsonl sinks, options are passed to the sink.
+    """
+    if format is None:
+        name = str(path)
+        if _infer_compression(name) is not None:
+            name = os.path.splitext(name)[0]
+        format = FORMATS.get(os.path.splitext(name)[1].lower())
+        if format is None:
+            raise ValueError("Can't infer the export format of {}, pass format".format(path))
+    if format == "csv":
+        return CsvSink(path, compression, **options)
+    if format == "jsonl":
+        return JsonLinesSink(path, compression, codec=codec, **options)
+    if format == "parquet":
+        return ParquetSink(path, {"infer": "snappy", None: "none"}.get(compression, compression), **options)
+    raise ValueError("Unknown export format: {}, expected one of csv, jsonl, parquet".format(format))
@@ -0,0 +1,137 @@
+import inspect
+import logging
+import time
+
+from spr_api.errors import SprApiError
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger("row_stream")
+
+ROWS_PREFIX = "data.rows.item"
+HEADINGS_PREFIX = "data.headings"
+ERRORS_PREFIX = "errors"
+READ_SIZE = 64 * 1024
+
+
+def require_ijson():
+    if ijson is None:
+        raise ImportError("Streaming responses requires ijson, install it with: pip install ijson")
+
+
+class ResponseReader:
+    """
+    File-like view of the body of a streamed requests.Response, decompressed, which records the bytes and time
+    spent reading on a RequestInfo.
+    """
+
+    def __init__(self, response, info):
+        self.response = response
+        self.info = info
+
+    def read(self, size=-1):
+        if size == 0:
+            # ijson probes the reader with read(0) to tell bytes from str
+            return b""
+        start = time.perf_counter()
+        chunk = self.response.raw.read(size if size is not None and size >= 0 else None, decode_content=True)
+        self.info.timings["download"] += time.perf_counter() - start
+        self.info.bytes_received += len(chunk)
+        return chunk
+
+    def close(self):
+        self.response.close()
+
+
+class RowStream:
+    """
+    Rows of a reports/query response ({"data": {"headings": [...], "rows": [...]}, "errors": [...]}), decoded
+    incrementally while they are iterated, so the first row is available before the body was downloaded and the
+    whole page is never held in memory. Single use. headings is set once the headings were parsed, which is before
+    the first row when the api sends them first.
+    """
+
+    def __init__(self, reader, info, on_done):
+        """
+        Parameters
+        ----------
+        reader : file-like body of the response, closed when the stream ends
+        info : RequestInfo of the call, decode time is recorded on it
+        on_done : called with the error or None once the stream ended or was closed
+        """
+        require_ijson()
+        self.reader = reader
+        self.info = info
+        self.on_done = on_done
+        self.headings = None
+        self.rows_read = 0
+        self._rows = self._parse()
+
+    def __iter__(self):
+        return self._rows
+
+    def __next__(self):
+        return next(self._rows)
+
+    def _parse(self):
+        error = None
+        busy = 0.0
+        read_before = self.info.timings["download"]
+        resumed = time.perf_counter()
+        builder = None
+        target = None
+        try:
+            for prefix, event, value in ijson.parse(self.reader, buf_size=READ_SIZE, use_float=True):
+                if builder is None:
+                    if event not in ("start_array", "start_map") or \
+                            prefix not in (ROWS_PREFIX, HEADINGS_PREFIX, ERRORS_PREFIX):
+                        continue
+                    builder = ijson.ObjectBuilder()
+                    target = prefix
+                builder.event(event, value)
+                if prefix != target or event not in ("end_array", "end_map"):
+                    continue
+
+                value, builder = builder.value, None
+                if target == ROWS_PREFIX:
+                    self.rows_read += 1
+                    busy += time.perf_counter() - resumed
+                    resumed = None
+                    yield value
+                    resumed = time.perf_counter()
+                elif target == HEADINGS_PREFIX:
+                    self.headings = value
+                elif value:
+                    logger.error("There was an error with this request: \n{}\n{}".format(self.info.url, value))
+                    raise SprApiError(value, self.info.status)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if resumed is not None:
+                busy += time.perf_counter() - resumed
+            # time spent reading the socket is already recorded as download
+            self.info.timings["decode"] += max(busy - (self.info.timings["download"] - read_before), 0.0)
+            self.reader.close()
+            self.on_done(error if isinstance(error, Exception) else None)
+
+    def close(self):
+        """
+        Stops the stream and releases its connection, the rest of the body is not read.
+        """
+        if inspect.getgeneratorstate(self._rows) == inspect.GEN_CREATED:
+            # never iterated, the cleanup of _parse would not run
+            self._rows.close()
+            self.reader.close()
+            self.on_done(None)
+        else:
+            self._rows.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,22 +1,119 @@
-import requests
+import io
 import logging
+import threading
+import time
 
+from spr_api.endpoints import OAUTH_PATH
+from spr_api.errors import SprApiError
+from spr_api.instrumentation import Hooks, RequestInfo, PRE_REQUEST, POST_RESPONSE, ON_RETRY, ON_REFRESH
+from spr_api.json_codec import get_codec, is_not_json
+from spr_api.rate_limit import RateLimiter, rate_limiter, is_throttled, throttle_delay, DEFAULT_RATE, DEFAULT_BURST, \
+    DEFAULT_MAX_THROTTLE_RETRIES
+from spr_api.row_stream import RowStream, ResponseReader, require_ijson
 from spr_api.spr_auth import SprAuth
 from spr_api.spr_auth import DEFAULT_BASE_URL
+from spr_api.token_manager import TokenManager, DEFAULT_REFRESH_SKEW
+from spr_api.transport import create_session, DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_SIZE, DEFAULT_MAX_RETRIES, \
+    DEFAULT_BACKOFF_FACTOR, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
 
 logger = logging.getLogger("apr_app")
 
 
+def api_url(base_url, env, endpoint):
+    """
+    Returns the full url of an api/v2 endpoint for the env.
+    """
+    if env != 'prod':
+        base_url = base_url + env + "/"
+    return base_url + "api/v2/" + endpoint
+
+
 class SprApp:
     """
     Application object used to make api calls.
     """
 
     def __init__(self, base_url=DEFAULT_BASE_URL, env=None, key=None, secret=None, redirect_uri=None, username=None,
-                 password=None, auth_code=None):
+                 password=None, auth_code=None, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_size=DEFAULT_POOL_SIZE,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT, keep_alive=True,
+                 session=None, refresh_skew=DEFAULT_REFRESH_SKEW, background_refresh=False, credentials_store=None,
+                 codec=None, rate_limit=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 max_throttle_retries=DEFAULT_MAX_THROTTLE_RETRIES):
+        """
+        Parameters
+        ----------
+        base_url : base url of the sprinklr api
+        env, key, secret, redirect_uri, username, password, auth_code : see SprAuth
+        pool_connections : no of distinct hosts for which a connection pool is cached
+        pool_size : max no of keep-alive connections kept open per host, should be >= no of threads using this app
+        max_retries : no of retries on connection errors and 502/503/504 responses
+        backoff_factor : exponential backoff factor between retries, in seconds
+        connect_timeout : seconds to wait for a connection to be established
+        read_timeout : seconds to wait for the server to send a response
+        keep_alive : reuse connections between calls, disable only for debugging
+        session : an already configured requests.Session, overrides the pool and retry parameters
+        refresh_skew : seconds before expiry at which the access token is refreshed ahead of time
+        background_refresh : refresh the access token on a timer thread instead of on the first call after the skew,
+            the thread runs until close() is called, so use the app as a context manager or close it
+        credentials_store : TokenStore the tokens are read from and saved to, see spr_api.token_store
+        codec : json codec of request and response bodies, a name ("json", "orjson") or a JsonCodec, defaults to
+            orjson when it is installed, see spr_api.json_codec
+        rate_limit : max calls per second for the env/key, the calls of every app of the process using the key are
+            paced by one shared token bucket (see spr_api.rate_limit), which slows down further when the rate limit
+            headers show the quota running low. A RateLimiter to use a specific bucket, None to disable pacing.
+        burst : max calls sent back to back after an idle period, when rate_limit is a number
+        max_throttle_retries : no of times a call rejected by the rate limits (429) is sent again, after the
+            Retry-After of the response plus a random jitter
+        """
         self.base_url = base_url
+        self.codec = get_codec(codec)
+        self.timeout = (connect_timeout, read_timeout)
+        if session is None:
+            session = create_session(pool_connections=pool_connections, pool_size=pool_size,
+                                     max_retries=max_retries, backoff_factor=backoff_factor, keep_alive=keep_alive)
+        self.session = session
         self.spr_auth = SprAuth(env, key, secret, redirect_uri, username=username, password=password,
-                                auth_code=auth_code)
+                                auth_code=auth_code, base_url=base_url, session=session, timeout=self.timeout,
+                                credentials_store=credentials_store)
+        if rate_limit is not None and not isinstance(rate_limit, RateLimiter):
+            rate_limit = rate_limiter(self.spr_auth.env, self.spr_auth.key, rate_limit, burst)
+        self.rate_limiter = rate_limit
+        self.max_throttle_retries = max_throttle_retries
+        self.hooks = Hooks()
+        self._local = threading.local()
+        self.token_manager = TokenManager(self.spr_auth, skew=refresh_skew, background=background_refresh,
+                                          on_refresh=self._refreshed)
+
+    def add_hook(self, event, callback):
+        """
+        Registers callback(RequestInfo) for an event of every call made by this app.
+
+        Parameters
+        ----------
+        event : one of
+            "pre_request" - before the call is sent
+            "post_response" - after the call completed or failed, with status, bytes, timings and error
+            "on_retry" - every time the call is sent again, after a 5xx/connection error, a 401 or a 429
+            "on_refresh" - after every access token refresh, endpoint is oauth/token/ and timings["refresh"] is set
+        callback : callable taking a spr_api.instrumentation.RequestInfo
+        """
+        self.hooks.add(event, callback)
+
+    def remove_hook(self, event, callback):
+        self.hooks.remove(event, callback)
+
+    def last_request_info(self):
+        """
+        Returns the RequestInfo of the last call made from the current thread, None before the first one.
+        """
+        return getattr(self._local, "info", None)
+
+    def _refreshed(self, elapsed, error):
+        info = RequestInfo("POST", OAUTH_PATH, self.base_url + OAUTH_PATH)
+        info.timings["refresh"] = info.timings["total"] = elapsed
+        info.error = error
+        self.hooks.emit(ON_REFRESH, info)
 
     def request(self, method, endpoint, params=None, headers=None, data=None):
         """
@@ -24,6 +121,52 @@ class SprApp:
         Returns the response from api call.
         """
 
+        info, params, headers, data = self._prepare(method, endpoint, params, headers, data)
+        self.hooks.emit(PRE_REQUEST, info)
+        start = time.perf_counter()
+        try:
+            response = self._send_authorized(info, headers, data, params)
+            return self._decode(info, response, data)["data"]
+        except Exception as e:
+            info.error = e
+            raise
+        finally:
+            info.timings["total"] = time.perf_counter() - start
+            self.hooks.emit(POST_RESPONSE, info)
+
+    def stream(self, method, endpoint, params=None, headers=None, data=None):
+        """
+        Same as request for endpoints returning {"data": {"headings": [...], "rows": [...]}} (reports/query), but
+        the rows are decoded incrementally from the socket while they are iterated, so time to first row and peak
+        memory do not grow with the page size. Requires ijson.
+
+        Returns
+        -------
+        RowStream - iterable over the rows, see spr_api.row_stream. Close it (or use it as a context manager) when
+        it is not iterated to the end.
+        """
+        require_ijson()
+        info, params, headers, data = self._prepare(method, endpoint, params, headers, data)
+        self.hooks.emit(PRE_REQUEST, info)
+        start = time.perf_counter()
+
+        def done(error):
+            info.error = error
+            info.timings["total"] = time.perf_counter() - start
+            self.hooks.emit(POST_RESPONSE, info)
+
+        try:
+            response = self._send_authorized(info, headers, data, params, read=False)
+            if response.status_code != 200:
+                # error responses are small and already read, raises for the api errors
+                self._decode(info, response, data)
+                return RowStream(io.BytesIO(response.content), info, done)
+            return RowStream(ResponseReader(response, info), info, done)
+        except Exception as e:
+            done(e)
+            raise
+
+    def _prepare(self, method, endpoint, params, headers, data):
         # initial default parameters
         if data is None:
             data = {}
@@ -34,41 +177,112 @@ class SprApp:
 
         # adding auth headers
         if not "Authorization" in headers:
-            headers["Authorization"] = "Bearer {}".format(self.spr_auth.access_token)
+            headers["Authorization"] = "Bearer {}".format(self.token_manager.access_token())
         if not "Key" in headers:
             headers["Key"] = self.spr_auth.key
 
-        # Adding base url to the endpoint
-        base_url = self.base_url
-        if self.spr_auth.env != 'prod':
-            base_url = base_url + self.spr_auth.env + "/"
-        endpoint = base_url + "api/v2/" + endpoint
+        info = RequestInfo(method, endpoint, api_url(self.base_url, self.spr_auth.env, endpoint))
+        self._local.info = info
+        return info, params, headers, data
 
-        response = requests.request(method, endpoint, headers=headers, data=data, params=params)
+    def _send_authorized(self, info, headers, data, params, read=True):
+        """
+        Sends the call, and sends it again with a refreshed access token when it was rejected with a 401.
+        """
+        response = self._send(info, headers, data, params, read)
         if response.status_code == 401:
-            self.spr_auth.gen_access_token_from_refresh_token()
-            response = requests.request(method, endpoint, headers=headers, data=data, params=params)
+            refresh_start = time.perf_counter()
+            self.token_manager.refresh(stale_token=headers["Authorization"][len("Bearer "):])
+            info.timings["refresh"] += time.perf_counter() - refresh_start
+            headers["Authorization"] = "Bearer {}".format(self.spr_auth.access_token)
+            info.retries += 1
+            info.retry_reasons.append(401)
+            self.hooks.emit(ON_RETRY, info)
+            response = self._send(info, headers, data, params, read)
+        return response
 
+    def _decode(self, info, response, data):
+        decode_start = time.perf_counter()
         try:
-            response.json()
+            # decoded once, report pages can be several MB
+            body = self.codec.loads(response.content)
         except ValueError as e:
             # handles non-json responses (e.g. HTTP 404, 500, 502, 503, 504)
-            if "Expecting value: line 1 column 1 (char 0)" in str(e):
+            if is_not_json(e):
                 logger.error(
                     "There was an error with this request: \n{}\n{}\n{}".format(
                         response.url, data, response.text
                     )
                 )
-                raise RuntimeError(response.text)
+                raise SprApiError(response.text, response.status_code)
             else:
                 raise
-        else:
-            if "errors" in response.json() and response.json()["errors"]:
-                logger.error(
-                    "There was an error with this request: \n{}\n{}\n{}".format(
-                        response.url, data, response.json()["errors"]
-                    )
+        finally:
+            info.timings["decode"] += time.perf_counter() - decode_start
+
+        if "errors" in body and body["errors"]:
+            logger.error(
+                "There was an error with this request: \n{}\n{}\n{}".format(
+                    response.url, data, body["errors"]
                 )
-                raise RuntimeError(response.json()["errors"])
+            )
+            raise SprApiError(body["errors"], response.status_code)
+
+        return body
+
+    def _send(self, info, headers, data, params, read=True):
+        """
+        Sends one attempt of the call, recording status, sizes, timings and the retries done by the transport on
+        info. The call waits for its turn in the rate limiter first, and is sent again when it was throttled. The
+        body is read unless read is False and the status is 200.
+        """
+        throttled = 0
+        while True:
+            if self.rate_limiter is not None:
+                info.timings["throttle"] += self.rate_limiter.acquire()
+            start = time.perf_counter()
+            # streamed so the wait for the response headers and the body download are timed apart
+            response = self.session.request(info.method, info.url, headers=headers, data=data, params=params,
+                                            timeout=self.timeout, stream=True)
+            info.timings["wait"] += time.perf_counter() - start
+            info.status = response.status_code
+            info.bytes_sent += len(response.request.body or b"")
+            if read or response.status_code != 200:
+                headers_received = time.perf_counter()
+                info.bytes_received += len(response.content)
+                info.timings["download"] += time.perf_counter() - headers_received
+            # attempts retried by the urllib3 Retry of the session, before this response
+            retries = getattr(response.raw, "retries", None)
+            for attempt in getattr(retries, "history", ()):
+                info.retries += 1
+                info.retry_reasons.append(attempt.status if attempt.status is not None else repr(attempt.error))
+                self.hooks.emit(ON_RETRY, info)
+            if self.rate_limiter is not None:
+                self.rate_limiter.observe(response.headers)
+            if not is_throttled(response.status_code, response.headers) or throttled >= self.max_throttle_retries:
+                return response
+            delay = throttle_delay(response.headers, throttled)
+            logger.info("Call to {} was throttled, sending it again in {:.1f}s".format(info.endpoint, delay))
+            if self.rate_limiter is not None:
+                # holds the other calls of the key too, they would be throttled as well
+                self.rate_limiter.pause(delay)
+            else:
+                time.sleep(delay)
+                info.timings["throttle"] += delay
+            throttled += 1
+            info.retries += 1
+            info.retry_reasons.append(response.status_code)
+            self.hooks.emit(ON_RETRY, info)
+
+    def close(self):
+        """
+        Closes the pooled connections held by this app and stops the background token refresh.
+        """
+        self.token_manager.stop()
+        self.session.close()
+
+    def __enter__(self):
+        return self
 
-        return response.json()["data"]
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
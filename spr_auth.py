@@ -1,9 +1,15 @@
-import requests
 from urllib.parse import quote_plus
+import logging
 import time
 
 from .credentials import CredentialsFile
 from .endpoints import DEFAULT_BASE_URL, OAUTH_PATH
+from .transport import create_session, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+logger = logging.getLogger("spr_auth")
+
+# max seconds a process waits for another process to finish refreshing the same token
+DEFAULT_REFRESH_LOCK_TIMEOUT = 30
 
 class SprAuth:
     """
@@ -11,7 +17,8 @@ class SprAuth:
     """
 
     def __init__(self, env=None, key=None, secret=None, redirect_uri=None, username=None, password=None,
-                 auth_code=None):
+                 auth_code=None, base_url=DEFAULT_BASE_URL, session=None,
+                 timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT), credentials_store=None):
         """
                Parameters
                ----------
@@ -29,11 +36,21 @@ class SprAuth:
                    Sprinklr Password
                auth_code : str, optional, to be used when using oauth
                    One time authorization code generated for creating the access token. Auth Code is valid only for 10 min.
+               base_url : str, optional
+                   Base url of the sprinklr api
+               session : requests.Session, optional
+                   Pooled session used for the oauth calls, shared with SprApp so auth calls reuse its connections
+               timeout : tuple, optional
+                   (connect timeout, read timeout) in seconds for the oauth calls
+               credentials_store : TokenStore, optional
+                   Where tokens are read from and saved to, defaults to the CredentialsFile in the home directory
                """
 
-        self.base_url = DEFAULT_BASE_URL
-        self.credentials_file = CredentialsFile()
-        auth_dict = self.credentials_file.read_file()
+        self.base_url = base_url
+        self.session = session if session is not None else create_session()
+        self.timeout = timeout
+        self.credentials_file = credentials_store if credentials_store is not None else CredentialsFile()
+        auth_dict = self.credentials_file.read_all()
 
         if env is None and key is None:
             if len(auth_dict) == 0:
@@ -104,7 +121,8 @@ class SprAuth:
             "Content-Type": "application/x-www-form-urlencoded"
         }
         payload = {}
-        response = requests.request(method="POST", url=endpoint, params=params, headers=headers, data=payload)
+        response = self.session.request(method="POST", url=endpoint, params=params, headers=headers, data=payload,
+                                        timeout=self.timeout)
         if response.status_code == 200:
             return response.json()
         else:
@@ -130,7 +148,8 @@ class SprAuth:
             "Content-Type": "application/x-www-form-urlencoded"
         }
         payload = {}
-        response = requests.request(method="POST", url=endpoint, params=params, headers=headers, data=payload)
+        response = self.session.request(method="POST", url=endpoint, params=params, headers=headers, data=payload,
+                                        timeout=self.timeout)
         if response.status_code == 200:
             return response.json()
         else:
@@ -142,6 +161,71 @@ class SprAuth:
         Generates Auth Token from Refresh Token. If successful returns response, otherwise raises Exception.
         """
 
+        endpoint, params, headers = self._refresh_token_request()
+        payload = {}
+        response = self.session.request(method="POST", url=endpoint, params=params, headers=headers, data=payload,
+                                        timeout=self.timeout)
+        if response.status_code == 200:
+            response = response.json()
+            self._save_token_response(response)
+            return response
+        else:
+            raise Exception(
+                "Error occurred while generating Auth Token from Refresh Token. Response : " + response.text)
+
+    def refresh_access_token(self, stale_token=None, lock_timeout=DEFAULT_REFRESH_LOCK_TIMEOUT):
+        """
+        Refreshes the access token once across all processes sharing the credentials store. The refresh runs
+        under the store's refresh lock. Processes waiting on the lock pick up the token saved by the one holding
+        it instead of refreshing again, which would invalidate the rotated refresh token. If the lock is not
+        released within lock_timeout seconds, the store is read again and the token is refreshed with the latest
+        refresh token saved in it.
+
+        Parameters
+        ----------
+        stale_token : access token to be replaced, defaults to the current one
+        lock_timeout : max seconds to wait for another process refreshing the same token
+        """
+        if stale_token is None:
+            stale_token = self.access_token
+        if self._load_refreshed_token(stale_token):
+            return
+        with self.credentials_file.refresh_lock(self.env, self.key, lock_timeout) as acquired:
+            if self._load_refreshed_token(stale_token):
+                return
+            if acquired:
+                self.gen_access_token_from_refresh_token()
+                return
+            logger.warning("Timed out waiting for the token refresh of another process, refreshing the token")
+            try:
+                self.gen_access_token_from_refresh_token()
+            except Exception:
+                # the other process may have rotated the refresh token while this one was refreshing
+                if self._load_refreshed_token(stale_token):
+                    return
+                raise
+
+    def _load_refreshed_token(self, stale_token):
+        """
+        Takes over the refresh token of the credentials store when another process rotated it, and its access
+        token when it replaced stale_token and has not expired. Returns True if the access token was taken over,
+        False when it still has to be refreshed (with the refresh token of the store).
+        """
+        stored = self.credentials_file.get(self.env, self.key)
+        if not stored:
+            return False
+        if stored.get("refresh_token") and stored["refresh_token"] != self.refresh_token:
+            self.refresh_token = stored["refresh_token"]
+        if stored.get("access_token") in (None, stale_token) or stored["expires_at"] <= time.time():
+            return False
+        self.access_token = stored["access_token"]
+        self.expires_at = stored["expires_at"]
+        return True
+
+    def _refresh_token_request(self):
+        """
+        Returns (endpoint, params, headers) of the refresh token call.
+        """
         endpoint = self.base_url + self.env + "/" + OAUTH_PATH
         params = {
             "client_id": self.key,
@@ -153,16 +237,14 @@ class SprAuth:
         headers = {
             "Content-Type": "application/x-www-form-urlencoded"
         }
-        payload = {}
-        response = requests.request(method="POST", url=endpoint, params=params, headers=headers, data=payload)
-        if response.status_code == 200:
-            response = response.json()
-            self.access_token, self.refresh_token = response["access_token"], response["refresh_token"]
-            self.expires_at = time.time() + response["expires_in"]
-            self.credentials_file.update_key(
-                key=self.key, env=self.env, secret=self.secret, redirect_uri=self.redirect_uri,
-                refresh_token=self.refresh_token, access_token=self.access_token, expires_at=self.expires_at)
-            return response
-        else:
-            raise Exception(
-                "Error occurred while generating Auth Token from Refresh Token. Response : " + response.text)
+        return endpoint, params, headers
+
+    def _save_token_response(self, response):
+        """
+        Stores the tokens of a successful refresh token response on this object and in the credentials file.
+        """
+        self.access_token, self.refresh_token = response["access_token"], response["refresh_token"]
+        self.expires_at = time.time() + response["expires_in"]
+        self.credentials_file.update_key(
+            key=self.key, env=self.env, secret=self.secret, redirect_uri=self.redirect_uri,
+            refresh_token=self.refresh_token, access_token=self.access_token, expires_at=self.expires_at)
@@ -0,0 +1,34 @@
+import threading
+
+from spr_api.reporting.Prefetch import prefetch
+
+
+class _FailingPages:
+    def __iter__(self):
+        raise RuntimeError("no pages")
+
+
+def _drain(pages):
+    result = {}
+
+    def consume():
+        try:
+            result["pages"] = list(prefetch(pages))
+        except Exception as e:
+            result["error"] = e
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    consumer.join(5)
+    assert not consumer.is_alive(), "the consumer is still waiting for a page"
+    return result
+
+
+def test_pages_are_read_in_order():
+    assert _drain(iter(range(10))) == {"pages": list(range(10))}
+
+
+def test_page_source_failing_immediately_raises_to_the_caller():
+    result = _drain(_FailingPages())
+    assert isinstance(result["error"], RuntimeError)
+    assert str(result["error"]) == "no pages"
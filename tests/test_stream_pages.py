@@ -0,0 +1,62 @@
+import time
+
+from spr_api.benchmarks.stub_server import SimulatorConfig, base_url, start_stub_server
+from spr_api.reporting.Checkpoint import Checkpoint
+from spr_api.reporting.Paging import StreamPages
+from spr_api.spr_app import SprApp
+from spr_api.token_store import MemoryTokenStore
+
+ENV = "prod"
+KEY = "stream-key"
+PAYLOAD = {"reportingEngine": "LISTENING", "report": "SPRINKSIGHTS", "pageSize": 10, "page": 0,
+           "groupBys": [{"heading": "Message Id", "dimensionName": "ES_MESSAGE_ID"}],
+           "projections": [{"heading": "Mentions"}], "additional": {"STREAM": True}}
+
+
+def _app(server):
+    store = MemoryTokenStore({ENV: {KEY: {"secret": "secret", "redirect_uri": "http://localhost",
+                                          "access_token": "token", "refresh_token": "refresh",
+                                          "expires_at": time.time() + 3600}}})
+    return SprApp(base_url=base_url(server), env=ENV, key=KEY, credentials_store=store, rate_limit=None)
+
+
+def _message_ids(pages):
+    return [row[0] for page in pages for row in page["rows"]]
+
+
+def test_stream_follows_the_cursor():
+    server = start_stub_server(config=SimulatorConfig(pages=3))
+    try:
+        pages = StreamPages(_app(server), PAYLOAD)
+        message_ids = _message_ids(pages)
+    finally:
+        server.shutdown()
+
+    assert message_ids == ["message-{}".format(index) for index in range(35)]
+    assert (pages.page, pages.rows_emitted, pages.cursor) == (4, 35, None)
+    assert pages.headings == ["Message Id", "Mentions"]
+
+
+def test_interrupted_stream_resumes_at_the_saved_cursor(tmp_path):
+    server = start_stub_server(config=SimulatorConfig(pages=3))
+    try:
+        app = _app(server)
+        checkpoint = Checkpoint("stream", tmp_path)
+        delivered = []
+        pages = iter(StreamPages(app, PAYLOAD, checkpoint))
+        for page in pages:
+            delivered.append(page)
+            if len(delivered) == 2:
+                break
+        pages.close()
+
+        # the second page was not consumed completely, it is delivered again
+        resumed = StreamPages(app, PAYLOAD, checkpoint)
+        assert resumed.resumed
+        assert (resumed.page, resumed.rows_emitted, resumed.cursor) == (1, 10, "stream-cursor-10")
+        message_ids = _message_ids(delivered[:1]) + _message_ids(resumed)
+    finally:
+        server.shutdown()
+
+    assert message_ids == ["message-{}".format(index) for index in range(35)]
+    assert checkpoint.load() is None
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from spr_api.benchmarks.refresh_harness import ENV, KEY, run, start_fake_oauth_server
+from spr_api.spr_auth import SprAuth
+from spr_api.token_store import FileTokenStore, MemoryTokenStore
+
+
+def _auth(store, base_url="http://127.0.0.1:1/"):
+    return SprAuth(ENV, KEY, base_url=base_url, credentials_store=store)
+
+
+def _store(access_token, refresh_token, expires_at):
+    return MemoryTokenStore({ENV: {KEY: {"secret": "secret", "redirect_uri": "http://localhost",
+                                         "access_token": access_token, "refresh_token": refresh_token,
+                                         "expires_at": expires_at}}})
+
+
+def test_processes_sharing_a_store_refresh_once():
+    state, errors, _ = run(8)
+    assert errors == []
+    assert state["refresh_accepted"] == 1
+    assert state["refresh_rejected"] == 0
+
+
+def test_rotated_refresh_token_is_adopted_when_stored_access_token_expired():
+    store = _store("access-0", "refresh-0", time.time() + 3600)
+    auth = _auth(store)
+    store.update(ENV, KEY, access_token="access-1", refresh_token="refresh-1", expires_at=time.time() - 1)
+
+    assert not auth._load_refreshed_token("access-0")
+    assert auth.refresh_token == "refresh-1"
+    assert auth.access_token == "access-0"
+
+
+def test_stored_access_token_is_taken_over():
+    store = _store("access-0", "refresh-0", time.time() + 3600)
+    auth = _auth(store)
+    expires_at = time.time() + 3600
+    store.update(ENV, KEY, access_token="access-1", refresh_token="refresh-1", expires_at=expires_at)
+
+    assert auth._load_refreshed_token("access-0")
+    assert (auth.access_token, auth.refresh_token, auth.expires_at) == ("access-1", "refresh-1", expires_at)
+
+
+def test_lock_timeout_refreshes_with_the_latest_stored_refresh_token(tmp_path):
+    server, state = start_fake_oauth_server()
+    try:
+        host, port = server.server_address[:2]
+        store = FileTokenStore(tmp_path / "auth_file.txt")
+        store.update_key(KEY, ENV, "secret", "http://localhost", "stale-access", "outdated-refresh",
+                         time.time() + 3600)
+        auth = _auth(store, "http://{}:{}/".format(host, port))
+        # another process rotated the refresh token, its access token expired since
+        store.update(ENV, KEY, access_token="expired-access", refresh_token=state["refresh_token"],
+                     expires_at=time.time() - 1)
+
+        held, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with store.refresh_lock(ENV, KEY, 1):
+                held.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        held.wait()
+        try:
+            auth.refresh_access_token("stale-access", lock_timeout=0.2)
+        finally:
+            release.set()
+            holder.join()
+    finally:
+        server.shutdown()
+
+    assert state["refresh_accepted"] == 1
+    assert state["refresh_rejected"] == 0
+    assert auth.access_token == state["access_token"]
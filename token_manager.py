@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger("token_manager")
+
+DEFAULT_REFRESH_SKEW = 300
+# delay before a failed background refresh is tried again
+RETRY_DELAY = 30
+# min seconds between two refreshes started ahead of expiry, so a token living shorter than expected (or a refresh
+# not moving expires_at) does not cause a refresh loop
+MIN_REFRESH_INTERVAL = 10
+
+
+class _Refresh:
+    """
+    A refresh in flight, callers waiting for it block on done.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class TokenManager:
+    """
+    Keeps the access token of a SprAuth fresh. The token is refreshed ahead of time skew seconds before it
+    expires (at most half its lifetime before), callers only block on a refresh once the token has really
+    expired. Concurrent refreshes are collapsed into one call (single flight), and across processes by
+    SprAuth.refresh_access_token.
+    """
+
+    def __init__(self, spr_auth, skew=DEFAULT_REFRESH_SKEW, background=False, on_refresh=None):
+        """
+        Parameters
+        ----------
+        spr_auth : SprAuth holding the tokens
+        skew : seconds before expires_at at which the token is refreshed, capped at half the lifetime of the token
+        background : schedule the refresh on a timer thread, otherwise it is only started by access_token calls.
+                     The timer keeps running until stop() is called.
+        on_refresh : called with (seconds taken, error or None) after every refresh this manager ran
+        """
+        self.spr_auth = spr_auth
+        self.skew = skew
+        self.background = background
+        self.on_refresh = on_refresh
+        self._lock = threading.Lock()
+        self._refresh = None
+        self._timer = None
+        self._stopped = False
+        self._expires_at = None
+        self._lifetime = 0
+        self._started_at = None
+        self._schedule()
+
+    def _skew(self):
+        """
+        Returns the skew for the current token: at most half its lifetime, so a token issued with expires_in <=
+        skew is not due for a refresh as soon as it was issued.
+        """
+        expires_at = self.spr_auth.expires_at
+        if expires_at != self._expires_at:
+            self._expires_at = expires_at
+            self._lifetime = max(expires_at - time.time(), 0)
+        return min(self.skew, self._lifetime / 2)
+
+    def access_token(self):
+        """
+        Returns a valid access token, refreshing it when needed.
+        """
+        now = time.time()
+        expires_at = self.spr_auth.expires_at
+        if now >= expires_at:
+            self.refresh()
+        elif now >= expires_at - self._skew() and (self._started_at is None or
+                                                   time.monotonic() - self._started_at >= MIN_REFRESH_INTERVAL):
+            self.refresh(wait=False)
+        return self.spr_auth.access_token
+
+    def refresh(self, stale_token=None, wait=True):
+        """
+        Refreshes the access token, or joins the refresh already in flight.
+
+        Parameters
+        ----------
+        stale_token : access token rejected by the api, nothing is done if the token was refreshed since
+        wait : block until the refresh is done and raise its error, otherwise the refresh runs on a thread
+        """
+        with self._lock:
+            if stale_token is not None and stale_token != self.spr_auth.access_token:
+                return
+            refresh = self._refresh
+            leader = refresh is None
+            if leader:
+                refresh = self._refresh = _Refresh()
+                stale_token = self.spr_auth.access_token
+                self._started_at = time.monotonic()
+
+        if leader:
+            if wait:
+                self._run(refresh, stale_token)
+            else:
+                threading.Thread(target=self._run, args=(refresh, stale_token), name="spr-token-refresh",
+                                 daemon=True).start()
+                return
+        elif not wait:
+            return
+
+        refresh.done.wait()
+        if refresh.error is not None:
+            raise refresh.error
+
+    def _run(self, refresh, stale_token):
+        start = time.perf_counter()
+        try:
+            # coordinated with the other processes sharing the credentials store
+            self.spr_auth.refresh_access_token(stale_token)
+        except Exception as e:
+            logger.error("Could not refresh the access token: {}".format(e))
+            refresh.error = e
+        finally:
+            with self._lock:
+                self._refresh = None
+            refresh.done.set()
+            self._schedule(RETRY_DELAY if refresh.error is not None else None)
+            if self.on_refresh is not None:
+                self.on_refresh(time.perf_counter() - start, refresh.error)
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            # already logged, retried by the next scheduled refresh
+            pass
+
+    def _schedule(self, delay=None):
+        if not self.background:
+            return
+        with self._lock:
+            if self._stopped:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+            if delay is None:
+                delay = max(self.spr_auth.expires_at - self._skew() - time.time(), MIN_REFRESH_INTERVAL)
+            self._timer = threading.Timer(delay, self._background_refresh)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self):
+        """
+        Cancels the background refresh.
+        """
+        with self._lock:
+            self._stopped = True
+            if self._timer is not None:
+                self._timer.cancel()
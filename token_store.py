@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # advisory file locks are not available (e.g. windows), writes are then only serialised within the process
+    fcntl = None
+
+# seconds between two attempts to take a refresh lock held by someone else
+LOCK_POLL_INTERVAL = 0.05
+
+
+class TokenStore:
+    """
+    Stores the secret and tokens of every env and key, as a dictionary of the format described in
+    spr_api.credentials. Subclasses implement read_all and update, and refresh_lock when the store is shared
+    between processes.
+    """
+
+    _refresh_locks = {}
+    _refresh_locks_lock = threading.Lock()
+
+    def read_all(self):
+        """
+        Returns the dictionary of all envs and keys. The returned dictionary must not be modified.
+        """
+        raise NotImplementedError
+
+    def update(self, env, key, **fields):
+        """
+        Sets the fields of one env and key, keeping its other fields and all other envs and keys.
+        """
+        raise NotImplementedError
+
+    def get(self, env, key):
+        return self.read_all().get(env, {}).get(key)
+
+    @contextmanager
+    def refresh_lock(self, env, key, timeout):
+        """
+        Held while the token of env and key is refreshed, so only one holder of the store refreshes it at a time.
+        Yields True once the lock is acquired, or False when it could not be acquired within timeout seconds.
+        """
+        with TokenStore._refresh_locks_lock:
+            lock = TokenStore._refresh_locks.setdefault((id(self), env, key), threading.Lock())
+        acquired = lock.acquire(timeout=timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+
+    def read_file(self):
+        return {env: {key: dict(fields) for key, fields in keys.items()} for env, keys in self.read_all().items()}
+
+    def update_key(self, key, env, secret, redirect_uri, access_token, refresh_token, expires_at):
+        if (secret is None) or (redirect_uri is None) or (access_token is None) or (refresh_token is None) or (
+                expires_at is None):
+            raise ValueError("Error save new auth token, not all parameters are being generated correctly.")
+        self.update(env, key, secret=secret, redirect_uri=redirect_uri, access_token=access_token,
+                    refresh_token=refresh_token, expires_at=expires_at)
+
+
+class MemoryTokenStore(TokenStore):
+    """
+    Keeps the tokens in memory only, pass the same instance to every SprApp of the process to share them.
+    """
+
+    def __init__(self, initial=None):
+        self._data = {env: {key: dict(fields) for key, fields in keys.items()}
+                      for env, keys in (initial or {}).items()}
+        self._lock = threading.Lock()
+
+    def read_all(self):
+        return self._data
+
+    def update(self, env, key, **fields):
+        with self._lock:
+            data = {env_name: dict(keys) for env_name, keys in self._data.items()}
+            data.setdefault(env, {})
+            data[env][key] = dict(data[env].get(key, {}), **fields)
+            self._data = data
+
+
+class FileTokenStore(TokenStore):
+    """
+    Pickled credentials file. The parsed file is cached for the whole process and only read again when its
+    modification time or size changes. Updates are written to a temp file which is renamed over the credentials
+    file while an advisory lock is held, so concurrent writers from other processes never lose updates.
+    """
+
+    # path -> ((inode, mtime_ns, size), parsed dictionary), shared by all instances
+    _cache = {}
+    _cache_lock = threading.Lock()
+    _write_locks = {}
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        with FileTokenStore._cache_lock:
+            self._write_lock = FileTokenStore._write_locks.setdefault(str(self.path), threading.Lock())
+
+    def _stat_key(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError):
+            return {}
+
+    def read_all(self):
+        stat_key = self._stat_key()
+        cached = FileTokenStore._cache.get(str(self.path))
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+        data = self._load()
+        FileTokenStore._cache[str(self.path)] = (stat_key, data)
+        return data
+
+    @contextmanager
+    def lock(self):
+        """
+        Holds the advisory write lock of the credentials file, across threads and processes.
+        """
+        with self._write_lock:
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def refresh_lock(self, env, key, timeout):
+        """
+        Advisory lock on a lock file per env and key next to the credentials file, shared by all processes.
+        """
+        name = hashlib.sha1("{}/{}".format(env, key).encode()).hexdigest()[:16]
+        lock_path = self.path.with_name("{}.{}.refresh.lock".format(self.path.name, name))
+        with open(lock_path, 'a') as lock_file:
+            acquired = self._flock(lock_file, timeout)
+            try:
+                yield acquired
+            finally:
+                if acquired and fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _flock(lock_file, timeout):
+        if fcntl is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def update(self, env, key, **fields):
+        with self.lock():
+            data = {env_name: dict(keys) for env_name, keys in self.read_all().items()}
+            data.setdefault(env, {})
+            data[env][key] = dict(data[env].get(key, {}), **fields)
+            self._write(data)
+
+    def _write(self, data):
+        fd, temp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name + ".")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        FileTokenStore._cache[str(self.path)] = (self._stat_key(), data)
+
+
+class SqliteTokenStore(TokenStore):
+    """
+    Keeps the tokens in a sqlite database, one row per env and key, so a fleet of workers on a shared disk can
+    share refreshed tokens. Updates run in an immediate transaction.
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = str(path)
+        self.timeout = timeout
+        with closing(self._connect()) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS credentials "
+                               "(env TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL, PRIMARY KEY (env, key))")
+            connection.execute("CREATE TABLE IF NOT EXISTS refresh_locks "
+                               "(env TEXT NOT NULL, key TEXT NOT NULL, owner TEXT NOT NULL, expires_at REAL NOT NULL, "
+                               "PRIMARY KEY (env, key))")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+
+    def read_all(self):
+        data = {}
+        with closing(self._connect()) as connection:
+            for env, key, fields in connection.execute("SELECT env, key, data FROM credentials"):
+                data.setdefault(env, {})[key] = json.loads(fields)
+        return data
+
+    def get(self, env, key):
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT data FROM credentials WHERE env = ? AND key = ?", (env, key)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def update(self, env, key, **fields):
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT data FROM credentials WHERE env = ? AND key = ?", (env, key)).fetchone()
+            data = dict(json.loads(row[0]) if row is not None else {}, **fields)
+            connection.execute("INSERT OR REPLACE INTO credentials (env, key, data) VALUES (?, ?, ?)",
+                               (env, key, json.dumps(data)))
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    @contextmanager
+    def refresh_lock(self, env, key, timeout):
+        """
+        Lease in the refresh_locks table. A lease expires after timeout seconds, so a crashed holder does not block
+        the others for longer than that.
+        """
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        acquired = False
+        with closing(self._connect()) as connection:
+            while True:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("DELETE FROM refresh_locks WHERE env = ? AND key = ? AND expires_at < ?",
+                                   (env, key, time.time()))
+                acquired = connection.execute("INSERT OR IGNORE INTO refresh_locks (env, key, owner, expires_at) "
+                                              "VALUES (?, ?, ?, ?)",
+                                              (env, key, owner, time.time() + timeout)).rowcount == 1
+                connection.execute("COMMIT")
+                if acquired or time.monotonic() >= deadline:
+                    break
+                time.sleep(LOCK_POLL_INTERVAL)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    connection.execute("DELETE FROM refresh_locks WHERE env = ? AND key = ? AND owner = ?",
+                                       (env, key, owner))
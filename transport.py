@@ -0,0 +1,61 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+from spr_api.endpoints import OAUTH_PATH
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 120
+RETRY_STATUS_CODES = (502, 503, 504)
+
+
+class ApiRetry(Retry):
+    """
+    Retry of every method, except the token calls: with rotating refresh tokens a refresh sent again after it
+    reached the server would present a refresh token the first attempt already invalidated. Token calls are only
+    retried on connection errors, when the call was never sent.
+    """
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if url is not None and OAUTH_PATH in url and (error is None or not self._is_connection_error(error)):
+            raise MaxRetryError(_pool, url, error or ResponseError("token calls are not retried"))
+        return super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+
+
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_size=DEFAULT_POOL_SIZE,
+                   max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, keep_alive=True):
+    """
+    Creates a pooled requests Session used for all calls made by an SprApp (including auth calls).
+
+    Parameters
+    ----------
+    pool_connections : no of distinct hosts for which a connection pool is cached
+    pool_size : max no of keep-alive connections kept open per host
+    max_retries : no of retries on connection errors and 502/503/504 responses, 0 disables retrying
+    backoff_factor : exponential backoff factor between retries, in seconds
+    keep_alive : when False every request asks the server to close the connection
+    """
+    retry = ApiRetry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        # reporting and lookup calls are POSTs but do not modify anything on the server, token calls are excluded
+        # by ApiRetry
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session